@@ -1,21 +1,21 @@
 from flask import Flask, request, jsonify, session, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
+from sqlalchemy.orm import load_only
 from werkzeug.security import generate_password_hash, check_password_hash
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel, M2M100ForConditionalGeneration, M2M100Tokenizer
 from PIL import Image
 import numpy as np
-import torch
-import easyocr
 import pycld2
 
 import os
 import io
+import threading
 from collections import defaultdict
 from datetime import datetime
 
 from models.database import db, Users, ExtractHistory, TranslateHistory
 from models.llm import llm_translate
+from models.cpu_profile import load_model as load_cpu_model, configure_threads
 
 # Load environment variables from .env
 load_dotenv()
@@ -31,29 +31,83 @@ db.init_app(app)
 
 OCR_LANG = ['en', 'es', 'fr', 'de', 'it', 'pt', 'nl', 'pl', 'tr', 'sv', 'da', 'no']
 TRANSLATE_LANG = ['en', 'es', 'fr', 'de', 'it', 'pt', 'nl', 'pl', 'tr', 'sv', 'da', 'no']
-reader = easyocr.Reader(OCR_LANG, gpu=torch.cuda.is_available())
+# Maximum number of handwritten lines per TrOCR generate call
+TROCR_MAX_BATCH = int(os.getenv('TROCR_MAX_BATCH', '8'))
+finetune_dir = 'data/trocr-fr-handwritten'
 
-# Load TrOCR handwritten model
-en_handwritten_processor = TrOCRProcessor.from_pretrained('microsoft/trocr-base-handwritten', use_fast=True)
-en_handwritten_model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-base-handwritten')
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-en_handwritten_model.to(device)
+# Models are loaded on first use (or by the background preloader) rather than
+# at import, so the server starts serving right away
+_models = {}
+_models_lock = threading.RLock()
 
+def load_model(name, loader):
+    if name not in _models:
+        with _models_lock:
+            if name not in _models:
+                _models[name] = loader()
+    return _models[name]
 
-# Load fine-tuned TrOCR model if exist
-fr_handwritten_processor = en_handwritten_processor
-fr_handwritten_model = en_handwritten_model
-finetune_dir = 'data/trocr-fr-handwritten'
-if os.path.exists(finetune_dir):
-    fr_handwritten_processor = TrOCRProcessor.from_pretrained(finetune_dir, use_fast=True)
-    fr_handwritten_model = VisionEncoderDecoderModel.from_pretrained(finetune_dir)
-    print('Fine-tuned TrOCR model loaded.')
-fr_handwritten_model.to(device)
+def get_device():
+    import torch
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+def get_reader():
+    def load():
+        import torch
+        import easyocr
+        configure_threads()
+        return easyocr.Reader(OCR_LANG, gpu=torch.cuda.is_available())
+    return load_model('reader', load)
+
+# Load TrOCR handwritten model
+def load_trocr(path):
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+    processor = TrOCRProcessor.from_pretrained(path, use_fast=True)
+    model = load_cpu_model(path, lambda: VisionEncoderDecoderModel.from_pretrained(path), get_device())
+    return processor, model
+
+def get_handwritten_model(language='en'):
+    # Use fine-tuned TrOCR model for French if exist
+    if language == 'fr' and os.path.exists(finetune_dir):
+        def load():
+            print('Fine-tuned TrOCR model loaded.')
+            return load_trocr(finetune_dir)
+        return load_model('trocr_fr', load)
+    return load_model('trocr_en', lambda: load_trocr('microsoft/trocr-base-handwritten'))
 
 # Load M2M100 model and tokenizer
-nmt_model = M2M100ForConditionalGeneration.from_pretrained('facebook/m2m100_418M')
-nmt_tokenizer = M2M100Tokenizer.from_pretrained('facebook/m2m100_418M')
-nmt_model.to(device)
+def get_nmt_model():
+    def load():
+        from transformers import M2M100ForConditionalGeneration, M2M100Tokenizer
+        model = load_cpu_model(
+            'facebook/m2m100_418M',
+            lambda: M2M100ForConditionalGeneration.from_pretrained('facebook/m2m100_418M'),
+            get_device()
+        )
+        tokenizer = M2M100Tokenizer.from_pretrained('facebook/m2m100_418M')
+        return tokenizer, model
+    return load_model('nmt', load)
+
+# Load all models in the background at startup; /api/ready reports when done
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', '1') == '1'
+_preload_done = threading.Event()
+_preload_error = None
+
+def preload_models():
+    global _preload_error
+    try:
+        get_reader()
+        get_handwritten_model('en')
+        get_handwritten_model('fr')
+        get_nmt_model()
+    except Exception as e:
+        _preload_error = str(e)
+        print(f'Model preload failed: {e}')
+    finally:
+        _preload_done.set()
+
+if PRELOAD_MODELS:
+    threading.Thread(target=preload_models, daemon=True).start()
 
 def set_password(self, password):
     self.password_hash = generate_password_hash(password)
@@ -62,6 +116,7 @@ def check_password(self, password):
     return check_password_hash(self.password_hash, password)
 
 def preprocess_image(image, line_separation='auto'):
+    reader = get_reader()
     img_array = np.array(image)
     if line_separation == 'no':
         # Assume image contains only single line of text
@@ -159,19 +214,16 @@ def extract_image_text():
     printed_text, img_lines, confidences = preprocess_image(image, line_separation)
     # Use fine-tuned handwritten model if requested
     handwritten_texts = []
-    handwritten_processor = en_handwritten_processor
-    handwritten_model = en_handwritten_model
-    if input_language == 'fr':
-        handwritten_processor = fr_handwritten_processor
-        handwritten_model = fr_handwritten_model
     # Process handwritten text if needed
     if text_type in ['auto', 'handwritten'] and img_lines:
-        for img_line in img_lines:
-            img_line = img_line.resize((384, 384))
-            pixel_values = handwritten_processor(img_line, return_tensors='pt').pixel_values.to(device)
+        handwritten_processor, handwritten_model = get_handwritten_model(input_language)
+        device = get_device()
+        img_lines = [img_line.resize((384, 384)) for img_line in img_lines]
+        # Recognize lines in batches, one generate call per batch
+        for i in range(0, len(img_lines), TROCR_MAX_BATCH):
+            pixel_values = handwritten_processor(img_lines[i:i + TROCR_MAX_BATCH], return_tensors='pt').pixel_values.to(device)
             generated_ids = handwritten_model.generate(pixel_values)
-            handwritten_text = handwritten_processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-            handwritten_texts.append(handwritten_text)
+            handwritten_texts.extend(handwritten_processor.batch_decode(generated_ids, skip_special_tokens=True))
     # Join lines with newlines
     handwritten_result = '\n'.join(handwritten_texts) if handwritten_texts else ''
     printed_result = '\n'.join(printed_text) if printed_text else ''
@@ -229,6 +281,7 @@ def translate_text():
     else:
         # Machine translation
         if translation_model == 'nmt':
+            nmt_tokenizer, nmt_model = get_nmt_model()
             nmt_tokenizer.src_lang = detected_language
             # Tokenize input text
             encoded = nmt_tokenizer(
@@ -237,7 +290,7 @@ def translate_text():
                 padding=True,
                 truncation=True,
                 max_length=1024
-            ).to(device)
+            ).to(get_device())
             # Generate translation
             generated_tokens = nmt_model.generate(
                 **encoded,
@@ -265,31 +318,82 @@ def translate_text():
         'detected_language': detected_language
     })
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Keyset pagination on timestamp (unique per user), newest first, backed by the
+# (user_name, timestamp) primary key. Supports limit, cursor, fields and filters.
+def paginate_history(model, columns, filters, serialize):
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    # Only load the columns that are returned (never the image BLOB)
+    query = model.query.options(load_only(model.timestamp, *[getattr(model, c) for c in columns]))
+    query = query.filter_by(user_name=session['user_name'])
+    for column in filters:
+        value = request.args.get(column)
+        if value:
+            query = query.filter(getattr(model, column) == value)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query = query.filter(model.timestamp < datetime.fromisoformat(cursor))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    items = query.order_by(model.timestamp.desc()).limit(limit + 1).all()
+    next_cursor = items[limit - 1].timestamp.isoformat() if len(items) > limit else None
+    results = []
+    for i in items[:limit]:
+        item = serialize(i)
+        if fields:
+            item = {k: v for k, v in item.items() if k in fields}
+        results.append(item)
+    return jsonify({'items': results, 'next_cursor': next_cursor})
+
 @app.route('/api/extract_history', methods=['GET'])
 def get_extract_history():
     if 'user_name' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
-    items = ExtractHistory.query.filter_by(user_name=session['user_name']).order_by(ExtractHistory.timestamp.desc()).all()
-    return jsonify([{
-        'timestamp': i.timestamp.isoformat(),
-        'image_url': f'/api/image/{i.timestamp.isoformat()}',
-        'extracted_text': i.extracted_text,
-        'text_type': i.text_type,
-        'language': i.language
-    } for i in items])
+    return paginate_history(
+        ExtractHistory,
+        ['extracted_text', 'text_type', 'language'],
+        ['language', 'text_type'],
+        lambda i: {
+            'timestamp': i.timestamp.isoformat(),
+            'image_url': f'/api/image/{i.timestamp.isoformat()}',
+            'extracted_text': i.extracted_text,
+            'text_type': i.text_type,
+            'language': i.language
+        }
+    )
 
 @app.route('/api/translate_history', methods=['GET'])
 def get_translate_history():
     if 'user_name' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
-    items = TranslateHistory.query.filter_by(user_name=session['user_name']).order_by(TranslateHistory.timestamp.desc()).all()
-    return jsonify([{
-        'timestamp': i.timestamp.isoformat(),
-        'input_text': i.input_text,
-        'translated_text': i.translated_text,
-        'input_language': i.input_language,
-        'output_language': i.output_language
-    } for i in items])
+    return paginate_history(
+        TranslateHistory,
+        ['input_text', 'translated_text', 'input_language', 'output_language'],
+        ['input_language', 'output_language'],
+        lambda i: {
+            'timestamp': i.timestamp.isoformat(),
+            'input_text': i.input_text,
+            'translated_text': i.translated_text,
+            'input_language': i.input_language,
+            'output_language': i.output_language
+        }
+    )
+
+# Readiness probe: 200 once preloading has finished (or is disabled)
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    if PRELOAD_MODELS and not _preload_done.is_set():
+        return jsonify({'ready': False}), 503
+    if _preload_error:
+        return jsonify({'ready': False, 'error': _preload_error}), 503
+    return jsonify({'ready': True})
 
 @app.route('/api/login', methods=['POST'])
 def login():
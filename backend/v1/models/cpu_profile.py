@@ -0,0 +1,61 @@
+import os
+import re
+import threading
+
+# Dynamic int8 quantization of nn.Linear layers for CPU inference
+QUANTIZE_MODELS = os.getenv('QUANTIZE_MODELS', '0') == '1'
+QUANTIZED_CACHE_DIR = os.getenv('QUANTIZED_CACHE_DIR', 'data/quantized')
+# Torch thread counts; unset keeps the torch defaults
+TORCH_NUM_THREADS = os.getenv('TORCH_NUM_THREADS')
+TORCH_INTEROP_THREADS = os.getenv('TORCH_INTEROP_THREADS')
+
+_threads_lock = threading.Lock()
+_threads_configured = False
+
+def configure_threads():
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        import torch
+        if TORCH_NUM_THREADS:
+            torch.set_num_threads(int(TORCH_NUM_THREADS))
+        if TORCH_INTEROP_THREADS:
+            try:
+                torch.set_num_interop_threads(int(TORCH_INTEROP_THREADS))
+            except RuntimeError:
+                # Only allowed before the first inter-op parallel call
+                print('Inter-op thread count already fixed.')
+        _threads_configured = True
+
+# Load a model on the given device, quantized when running on CPU.
+# Quantized models are cached on disk so later starts load them directly.
+def load_model(name, loader, device):
+    import torch
+    configure_threads()
+    if not QUANTIZE_MODELS or device.type != 'cpu':
+        model = loader()
+        model.to(device)
+        model.eval()
+        return model
+    import transformers
+    key = f'{name}-torch{torch.__version__}-transformers{transformers.__version__}'
+    if os.path.isdir(name):
+        # Local (fine-tuned) models: re-quantize after they are retrained
+        key += f'-{max((int(e.stat().st_mtime) for e in os.scandir(name)), default=0)}'
+    path = os.path.join(QUANTIZED_CACHE_DIR, re.sub(r'[^\w.-]', '_', key) + '.pt')
+    if os.path.exists(path):
+        try:
+            model = torch.load(path, weights_only=False)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f'Ignoring unreadable quantized cache {path}: {e}')
+    model = loader()
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(QUANTIZED_CACHE_DIR, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    torch.save(model, tmp)
+    os.replace(tmp, path)
+    return model
@@ -1,24 +1,27 @@
 import io
 import os
-import torch
-import easyocr
-import shutil
-from werkzeug.utils import secure_filename
-from datasets import load_metric
+import json
+import base64
+import time
+import hashlib
+import threading
 from datetime import datetime
+from PIL import Image
 from flask import send_file
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import (
     JWTManager, create_access_token,
     jwt_required, get_jwt_identity
 )
-from database import get_db
+from database import get_db, release_db
 import sqlite3
-from detect_and_crop import detect_and_crop
-from extract_util import run_trocr, detect_img_language_auto, detect_text_type_auto
-from translation_model import translate_text, detect_text_language_auto
+from jobs import JobQueue, QueueFull
+from blob_store import image_store, store_history_image, backfill_thumbnail, THUMBNAIL_BACKFILL_LIMIT
+from translation_model import translate_text, detect_text_language_auto, model_manager, PRELOAD_PAIRS
+import metrics
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 app = Flask(__name__)
 
@@ -27,6 +30,80 @@ app.config["JWT_SECRET_KEY"] = "super-secret-key"
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 
+
+@app.teardown_request
+def teardown_db(exc):
+    # Connections are reused per thread; never leave a transaction open
+    release_db()
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    # Label by route pattern, not path, so ids don't explode the label set
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    if "request_start" in g:
+        # Observed when the response is closed, so streamed (NDJSON) bodies
+        # count until their last event has been sent
+        start = g.request_start
+        response.call_on_close(
+            lambda: metrics.REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - start))
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# The OCR pipeline (torch, EasyOCR, CRAFT, TrOCR) is imported on first use so
+# lightweight endpoints are served immediately. With PRELOAD_MODELS=1 the
+# models are loaded by a background thread; /api/ready reports when it is done.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") == "1"
+_preload_done = threading.Event()
+_preload_error = None
+
+
+def preload_models():
+    """Load CRAFT, TrOCR, the default EasyOCR readers and the MT_PRELOAD_PAIRS models."""
+    global _preload_error
+    t0 = time.time()
+    try:
+        from detect_and_crop import get_detector
+        from extract_util import get_trocr, preload_readers
+        get_detector()
+        get_trocr()
+        preload_readers()
+        model_manager.preload(PRELOAD_PAIRS)
+        print(f"Models preloaded in {time.time() - t0:.1f}s")
+    except Exception as e:
+        _preload_error = str(e)
+        print(f"Model preload failed: {e}")
+    finally:
+        _preload_done.set()
+
+
+if PRELOAD_MODELS:
+    threading.Thread(target=preload_models, name="model-preload", daemon=True).start()
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once preloading has finished (or is disabled)."""
+    if not PRELOAD_MODELS:
+        return jsonify({'ready': True, 'preload': False}), 200
+    if not _preload_done.is_set():
+        return jsonify({'ready': False, 'preload': True}), 503
+    if _preload_error:
+        return jsonify({'ready': False, 'preload': True, 'error': _preload_error}), 503
+    return jsonify({'ready': True, 'preload': True}), 200
+
+
 @app.route('/api/signup', methods=['POST'])
 def signup():
     data = request.get_json()
@@ -41,12 +118,11 @@ def signup():
 
     try:
         conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
-            (username, email, password_hash)
-        )
-        conn.commit()
+        with conn:
+            conn.execute(
+                "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                (username, email, password_hash)
+            )
 
     except sqlite3.IntegrityError:
         return jsonify({"error": "Username or email already exists"}), 400
@@ -109,7 +185,6 @@ def status():
             (current_user_id,)
         )
         user = cursor.fetchone()
-        conn.close()
         
         if user:
             return jsonify({
@@ -121,6 +196,57 @@ def status():
     return jsonify({'logged_in': False}), 200
 
 
+def extract_and_record(image_bytes, input_language, text_type, user_id=None,
+                       on_line=None, should_cancel=None):
+    """
+    Run (or fetch from cache) the extraction for an uploaded image and save it
+    to the history of an authenticated user. Raises ValueError for images
+    that cannot be decoded.
+    """
+    from pipeline import decode_image, run_extraction, request_workspace, result_cache
+
+    # Identical uploads with identical options skip inference entirely
+    cache_key = result_cache.make_key(image_bytes, input_language, text_type)
+    result = result_cache.get(cache_key)
+    if result is None:
+        image = decode_image(image_bytes)
+        with request_workspace() as workspace:
+            result = run_extraction(image, input_language, text_type, debug_dir=workspace,
+                                    on_line=on_line, should_cancel=should_cancel)
+        result_cache.put(cache_key, result)
+    elif on_line is not None:
+        for line in result.get("lines", []):
+            on_line(line)
+
+    if not result["regions"]:
+        return {
+            "extracted_text": "",
+            "text_type": text_type,
+            "detected_language": input_language
+        }
+
+    extracted_text = result["extracted_text"]
+    text_type = result["text_type"]
+    input_language = result["detected_language"]
+
+    # Save extraction history into SQLite for authenticated users
+    if user_id:
+        with metrics.stage("history_image"):
+            image_hash, thumb_hash = store_history_image(image_bytes)
+        conn = get_db()
+        with metrics.stage("db_write"), conn:
+            conn.execute("""
+                INSERT INTO extract_history (user_id, timestamp, image_hash, thumb_hash, extracted_text, text_type, language)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, datetime.now().isoformat(), image_hash, thumb_hash, extracted_text, text_type, input_language))
+
+    return {
+        "extracted_text": extracted_text,
+        'text_type': text_type,
+        'detected_language': input_language
+    }
+
+
 @app.route('/api/extract', methods=['POST'])
 @jwt_required(optional=True)
 def detect_extract():
@@ -129,74 +255,233 @@ def detect_extract():
 
     input_language = request.form.get('input_language', 'auto')
     text_type = request.form.get('text_type', 'auto')
+    image_bytes = request.files["image"].read()
+
+    if wants_stream():
+        return stream_extract(image_bytes, input_language, text_type, get_jwt_identity())
+
+    try:
+        result = extract_and_record(image_bytes, input_language, text_type, get_jwt_identity())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(result)
+
+
+def wants_stream():
+    if request.form.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return "application/x-ndjson" in request.headers.get("Accept", "")
+
+
+def stream_extract(image_bytes, input_language, text_type, user_id):
+    """
+    Stream an extraction as NDJSON: one "line" event per line in reading order
+    as soon as it is recognized, then a final "done" (or "error") event.
+    The extraction runs on the job queue, so streaming requests share its
+    workers and backpressure with /api/jobs.
+    """
+    params = {"image_bytes": image_bytes, "input_language": input_language, "text_type": text_type}
+    try:
+        job = extract_jobs.submit(params, owner=user_id)
+    except QueueFull:
+        return queue_full_response()
+
+    def generate():
+        try:
+            for event in job.iter_events():
+                if event["event"] == "status":
+                    if event["status"] == "done":
+                        event = {"event": "done", **event["result"]}
+                    else:
+                        event = {"event": "error", "error": event.get("error") or f"Extraction {event['status']}"}
+                yield json.dumps(event) + "\n"
+        finally:
+            # Client went away (or stream finished): stop recognizing further lines
+            extract_jobs.cancel(job.id)
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+# Batches with more pages than this, or still running after
+# BATCH_SYNC_TIMEOUT seconds, are answered with a job id (202) instead of
+# the result
+BATCH_SYNC_MAX_PAGES = int(os.getenv("BATCH_SYNC_MAX_PAGES", "4"))
+BATCH_SYNC_TIMEOUT = float(os.getenv("BATCH_SYNC_TIMEOUT", "30"))
+
+
+@app.route('/api/extract_batch', methods=['POST'])
+@jwt_required(optional=True)
+def detect_extract_batch():
+    from pipeline import pdf_page_count, BATCH_MAX_PAGES
+
+    files = [(file.filename or "", file.read()) for file in request.files.getlist("images")]
+    if not files:
+        return jsonify({"error": "No images uploaded"}), 400
 
-    # Create temp folders
-    UPLOAD_DIR = "uploads"
-    CROP_DIR = "crops"
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    os.makedirs(CROP_DIR, exist_ok=True)
-    
-    file = request.files["image"]
-    filename = secure_filename(file.filename)
-    path = os.path.join(UPLOAD_DIR, filename)
-    file.save(path)
-
-    # Detect + Crop
-    crop_paths = detect_and_crop(path, out_dir=CROP_DIR)
-    if not crop_paths:
+    # Unreadable PDFs count as one page; they are reported in errors
+    page_count = sum(max(1, pdf_page_count(data)) if data[:5] == b"%PDF-" else 1 for _, data in files)
+    if page_count > BATCH_MAX_PAGES:
         return jsonify({
-            "extracted_text": "",
-            "text_type": text_type,
-            "detected_language": input_language
+            "error": f"Batch has {page_count} pages; at most {BATCH_MAX_PAGES} pages per request"
+        }), 413
+
+    params = {
+        "kind": "batch",
+        "files": files,
+        "input_language": request.form.get('input_language', 'auto'),
+        "text_type": request.form.get('text_type', 'auto'),
+    }
+    # Batches run on the inference workers like /api/jobs, never in the HTTP thread
+    try:
+        job = extract_jobs.submit(params, owner=get_jwt_identity())
+    except QueueFull:
+        return queue_full_response()
+
+    # Never hold the HTTP thread for longer than the queue ahead may take
+    if page_count > BATCH_SYNC_MAX_PAGES or not job.wait(timeout=BATCH_SYNC_TIMEOUT):
+        return jsonify({"job_id": job.id, "status": job.status}), 202
+
+    if job.status != "done":
+        return jsonify({"error": job.error or f"Batch extraction {job.status}"}), 500
+    return jsonify(job.result)
+
+
+def run_batch_job(job):
+    """Decode every upload, rasterize every PDF page and extract them together."""
+    from pipeline import decode_image, rasterize_pdf, pdf_page_count, run_batch_extraction, BATCH_MAX_PAGES
+    params = job.params
+
+    pages = []  # (source filename, page number, RGB array)
+    errors = []
+    truncated = False
+    for name, data in params["files"]:
+        # The endpoint rejects oversized batches; anything still over the
+        # limit is reported rather than silently dropped
+        remaining = BATCH_MAX_PAGES - len(pages)
+        is_pdf = data[:5] == b"%PDF-"
+        if remaining <= 0:
+            truncated = True
+            errors.append({"source": name, "error": f"Skipped: page limit of {BATCH_MAX_PAGES} reached"})
+            continue
+        try:
+            if is_pdf:
+                images = rasterize_pdf(data, max_pages=remaining)
+            else:
+                images = [decode_image(data)]
+        except ValueError as e:
+            errors.append({"source": name, "error": str(e)})
+            continue
+        for number, image in enumerate(images, start=1):
+            pages.append((name, number, image))
+        if is_pdf and pdf_page_count(data) > len(images):
+            truncated = True
+            errors.append({"source": name, "error": f"Pages after {len(images)} skipped: page limit of {BATCH_MAX_PAGES} reached"})
+
+    results = run_batch_extraction([image for _, _, image in pages], params["input_language"],
+                                   params["text_type"], should_cancel=job.cancel_requested.is_set)
+
+    extracted = []
+    for (name, number, _), result in zip(pages, results):
+        if "error" in result:
+            errors.append({"source": name, "page": number, "error": result["error"]})
+            continue
+        extracted.append({
+            "source": name,
+            "page": number,
+            "extracted_text": result["extracted_text"],
+            "text_type": result["text_type"],
+            "detected_language": result["detected_language"],
+            "lines": result["lines"]
         })
+    return {"pages": extracted, "errors": errors, "truncated": truncated}
 
-    if input_language == "auto":
-        input_language = detect_img_language_auto(crop_paths)
-    if text_type == "auto":
-        text_type = detect_text_type_auto(crop_paths)
-
-    # Run OCR based on text type
-    if text_type == 'handwritten':
-        trocr_results = {}
-        for p in crop_paths:
-            trocr_results[p] = run_trocr(p)
-        extracted_text = "\n".join(trocr_results.values())
-    else:
-        easyocr_results = {}
-        reader = easyocr.Reader(["en", input_language], gpu=False)
-        for p in crop_paths:
-            result = reader.readtext(p, detail=0)
-            easyocr_results[p] = " ".join(result)
-        extracted_text = "\n".join(easyocr_results.values())
 
-    # Save extraction history into SQLite for authenticated users
-    current_user_id = get_jwt_identity()
-    if current_user_id:     
-        with open(path, "rb") as f:
-            image_bytes = f.read() # Read image bytes for saving to DB
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO extract_history (user_id, timestamp, image_data, extracted_text, text_type, language)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (current_user_id, datetime.now().isoformat(), image_bytes, extracted_text, text_type, input_language))
-        conn.commit()
-        conn.close()
+def run_extract_job(job):
+    # ExtractionCancelled propagates; the queue marks the job as cancelled
+    params = job.params
+    if params.get("kind") == "batch":
+        return run_batch_job(job)
+    return extract_and_record(
+        params["image_bytes"], params["input_language"], params["text_type"], job.owner,
+        on_line=job.add_line, should_cancel=job.cancel_requested.is_set
+    )
+
+
+extract_jobs = JobQueue(
+    run_extract_job,
+    workers=int(os.getenv("EXTRACT_JOB_WORKERS", "1")),
+    max_queued=int(os.getenv("EXTRACT_JOB_QUEUE_SIZE", "16")),
+    retention=int(os.getenv("EXTRACT_JOB_RETENTION", "3600")),
+)
+metrics.register_source("extract_jobs", lambda: {"queue_depth": extract_jobs.depth()})
+if int(os.getenv("GUNICORN_WORKERS", "1")) > 1:
+    # Jobs live in this process; polls routed to another worker get 404
+    print("Warning: extraction jobs are per process; run with GUNICORN_WORKERS=1 to use /api/jobs")
+
+
+def queue_full_response():
+    response = jsonify({"error": "Extraction queue is full, please retry later"})
+    response.headers["Retry-After"] = "5"
+    return response, 503
 
-    # Cleanup temp folders
+
+def get_owned_job(job_id):
+    job = extract_jobs.get(job_id)
+    if job is None or (job.owner and job.owner != get_jwt_identity()):
+        return None
+    return job
+
+
+@app.route('/api/jobs', methods=['POST'])
+@jwt_required(optional=True)
+def submit_extract_job():
+    if "image" not in request.files:
+        return jsonify({"error": "No image uploaded"}), 400
+
+    params = {
+        "image_bytes": request.files["image"].read(),
+        "input_language": request.form.get('input_language', 'auto'),
+        "text_type": request.form.get('text_type', 'auto'),
+    }
     try:
-        if os.path.exists(UPLOAD_DIR):
-            shutil.rmtree(UPLOAD_DIR)
-        if os.path.exists(CROP_DIR):
-            shutil.rmtree(CROP_DIR)
-    except Exception as e:
-        print(f"Error during cleanup: {e}")
+        job = extract_jobs.submit(params, owner=get_jwt_identity())
+    except QueueFull:
+        return queue_full_response()
 
-    return jsonify({
-        "extracted_text": extracted_text,
-        'text_type': text_type,
-        'detected_language': input_language
-    })
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required(optional=True)
+def get_extract_job(job_id):
+    job = get_owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@jwt_required(optional=True)
+def cancel_extract_job(job_id):
+    if get_owned_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    job = extract_jobs.cancel(job_id)
+    return jsonify(job.to_dict(include_lines=False)), 200
+
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+@jwt_required(optional=True)
+def stream_extract_job(job_id):
+    job = get_owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        for event in job.iter_events():
+            yield json.dumps(event) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 
 @app.route('/api/translate', methods=['POST'])
@@ -229,13 +514,11 @@ def translate():
     current_user_id = get_jwt_identity()
     if current_user_id:
         conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO translate_history (user_id, timestamp, input_text, translated_text, input_language, output_language)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (current_user_id, datetime.now().isoformat(), text, translated, src_lang, tgt_lang))
-        conn.commit()
-        conn.close()
+        with metrics.stage("db_write"), conn:
+            conn.execute("""
+                INSERT INTO translate_history (user_id, timestamp, input_text, translated_text, input_language, output_language)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (current_user_id, datetime.now().isoformat(), text, translated, src_lang, tgt_lang))
 
     return jsonify({
         "input_text": text,
@@ -244,31 +527,99 @@ def translate():
     })
 
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(timestamp, row_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def query_history(table, user_id, columns, filters, serialize):
+    """
+    Keyset-paginated history query on (timestamp, id), newest first, backed by
+    the (user_id, timestamp) index. Reads limit, cursor, fields and the given
+    filter columns from the query string. Returns a Flask response.
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+
+    fields = request.args.get("fields")
+    if fields:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(fields) - set(columns) - {"id", "timestamp", "image_url"}
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+        selected = [c for c in columns if c in fields]
+    else:
+        selected = list(columns)
+
+    where = ["user_id = ?"]
+    params = [user_id]
+    for column in filters:
+        value = request.args.get(column)
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+
+    cursor_arg = request.args.get("cursor")
+    if cursor_arg:
+        try:
+            params.extend(decode_cursor(cursor_arg))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        where.append("(timestamp, id) < (?, ?)")
+
+    # Column and table names come from fixed lists, never from the request
+    sql = f"""
+        SELECT {", ".join(["id", "timestamp"] + selected)}
+        FROM {table}
+        WHERE {" AND ".join(where)}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?
+    """
+    rows = get_db().execute(sql, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+    items = []
+    for r in rows:
+        item = serialize(r)
+        if fields:
+            item = {k: v for k, v in item.items() if k in fields}
+        items.append(item)
+    return jsonify({"items": items, "next_cursor": next_cursor}), 200
+
+
 @app.route('/api/extract_history', methods=['GET'])
 @jwt_required()
 def get_extract_history():
     current_user_id = get_jwt_identity()
     if current_user_id:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT timestamp, extracted_text, text_type, language
-            FROM extract_history
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-        """, (current_user_id, ))
-        rows = cursor.fetchall() 
-        result = []
-        for r in rows:
-            result.append({
+        return query_history(
+            "extract_history", current_user_id,
+            columns=("extracted_text", "text_type", "language", "thumb_hash"),
+            filters=("language", "text_type"),
+            serialize=lambda r: {
+                "id": r["id"],
                 "timestamp": r["timestamp"],
                 "image_url": f"/api/image/{r['timestamp']}",
-                "extracted_text": r["extracted_text"],
-                "text_type": r["text_type"],
-                "language": r["language"]
-            })
-        conn.close()
-        return jsonify(result), 200
+                **{k: r[k] for k in r.keys() if k not in ("id", "timestamp")}
+            }
+        )
     return jsonify({'error': 'Unauthorized'}), 401
 
 
@@ -277,29 +628,26 @@ def get_extract_history():
 def get_translate_history():
     current_user_id = get_jwt_identity()
     if current_user_id:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT timestamp, input_text, translated_text, input_language, output_language
-            FROM translate_history
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-        """, (current_user_id, ))
-        rows = cursor.fetchall() 
-        result = []
-        for r in rows:
-            result.append({
-                "timestamp": r["timestamp"],
-                "input_text": r["input_text"],
-                "translated_text": r["translated_text"],
-                "input_language": r["input_language"],
-                "output_language": r["output_language"]
-            })
-        conn.close()
-        return jsonify(result), 200
+        return query_history(
+            "translate_history", current_user_id,
+            columns=("input_text", "translated_text", "input_language", "output_language"),
+            filters=("input_language", "output_language"),
+            serialize=lambda r: {k: r[k] for k in r.keys()}
+        )
     return jsonify({'error': 'Unauthorized'}), 401
 
 
+HISTORY_IMAGE_MAX_AGE = int(os.getenv("HISTORY_IMAGE_MAX_AGE", "86400"))
+
+
+def guess_image_mimetype(image_bytes):
+    try:
+        image_format = Image.open(io.BytesIO(image_bytes)).format
+    except Exception:
+        return 'application/octet-stream'
+    return Image.MIME.get(image_format, 'application/octet-stream')
+
+
 @app.route('/api/image/<timestamp>', methods=['GET'])
 @jwt_required()
 def get_extracted_image(timestamp):
@@ -308,21 +656,115 @@ def get_extracted_image(timestamp):
         conn = get_db()
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT image_data FROM extract_history
+            SELECT image_hash, image_data FROM extract_history
             WHERE user_id = ? AND timestamp = ?
         """, (current_user_id, timestamp))
         row = cursor.fetchone()
-        conn.close()
-        if row is None or row["image_data"] is None:
+        if row is None or (row["image_hash"] is None and row["image_data"] is None):
             return jsonify({"error": "Image not found"}), 404
 
-        image_bytes = row["image_data"]
-        return send_file(
-            io.BytesIO(image_bytes),
-            mimetype='image/webp',
-            as_attachment=False,
-            download_name=f'img_{timestamp}.webp'
-        )
+        if row["image_hash"] is not None:
+            # Blobs are immutable, so the hash doubles as a strong ETag
+            try:
+                response = send_file(
+                    image_store.path_for(row["image_hash"]),
+                    mimetype='image/webp',
+                    as_attachment=False,
+                    download_name=f'img_{timestamp}.webp',
+                    etag=row["image_hash"],
+                    conditional=True,
+                    max_age=HISTORY_IMAGE_MAX_AGE
+                )
+            except FileNotFoundError:
+                return jsonify({"error": "Image not found"}), 404
+        else:
+            # Rows written before the blob store keep the raw upload in SQLite
+            image_bytes = row["image_data"]
+            response = send_file(
+                io.BytesIO(image_bytes),
+                mimetype=guess_image_mimetype(image_bytes),
+                as_attachment=False,
+                download_name=f'img_{timestamp}',
+                etag=hashlib.sha256(image_bytes).hexdigest(),
+                conditional=True,
+                max_age=HISTORY_IMAGE_MAX_AGE
+            )
+        response.cache_control.private = True
+        return response
+    return jsonify({'error': 'Unauthorized'}), 401
+
+
+def thumbnails_etag(hashes):
+    return hashlib.sha256(",".join(f"{i}:{h}" for i, h in sorted(hashes.items())).encode()).hexdigest()
+
+
+@app.route('/api/thumbnails', methods=['GET'])
+@jwt_required()
+def get_history_thumbnails():
+    """
+    Thumbnails for many extract history entries in one response, as
+    {"thumbnails": {id: data URI}}. Ids are given as ?ids=1,2,3.
+    """
+    current_user_id = get_jwt_identity()
+    if current_user_id:
+        try:
+            ids = [int(i) for i in request.args.get("ids", "").split(",") if i.strip()]
+        except ValueError:
+            return jsonify({"error": "Invalid ids"}), 400
+        if not ids:
+            return jsonify({"error": "No ids provided"}), 400
+        if len(ids) > HISTORY_MAX_PAGE_SIZE:
+            return jsonify({"error": f"At most {HISTORY_MAX_PAGE_SIZE} ids per request"}), 400
+
+        conn = get_db()
+        rows = conn.execute(f"""
+            SELECT id, thumb_hash FROM extract_history
+            WHERE user_id = ? AND id IN ({", ".join("?" * len(ids))})
+        """, [current_user_id] + ids).fetchall()
+
+        hashes = {}
+        complete = True
+        backfills = 0
+        for row in rows:
+            thumb_hash = row["thumb_hash"]
+            if thumb_hash is None:
+                # Entries saved before thumbnails existed get one on request,
+                # a few at a time so a single read stays cheap
+                if backfills >= THUMBNAIL_BACKFILL_LIMIT:
+                    complete = False
+                    continue
+                backfills += 1
+                thumb_hash = backfill_thumbnail(conn, row["id"])
+                if thumb_hash is None:
+                    continue
+            hashes[row["id"]] = thumb_hash
+
+        # Thumbnails are immutable, so the hashes identify the response and a
+        # revalidation is answered without reading any blob
+        etag = thumbnails_etag(hashes)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            thumbnails = {}
+            for row_id, thumb_hash in list(hashes.items()):
+                try:
+                    data = base64.b64encode(image_store.get(thumb_hash)).decode()
+                except OSError:
+                    del hashes[row_id]
+                    complete = False
+                    continue
+                thumbnails[str(row_id)] = f"data:image/webp;base64,{data}"
+            # Tag only what is actually returned
+            etag = thumbnails_etag(hashes)
+            response = jsonify({"thumbnails": thumbnails})
+        response.set_etag(etag)
+        response.cache_control.private = True
+        if complete:
+            response.cache_control.max_age = HISTORY_IMAGE_MAX_AGE
+        else:
+            # Thumbnails are still missing: revalidate instead of caching a partial set
+            response.cache_control.no_cache = True
+        return response
     return jsonify({'error': 'Unauthorized'}), 401
 
 
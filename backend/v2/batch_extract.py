@@ -0,0 +1,186 @@
+"""
+Offline batch extraction over a directory or manifest of images, without Flask.
+
+    python batch_extract.py scans/ --output results.jsonl --workers 4
+
+Work is spread over a process pool whose workers load the models once.
+PDFs are processed a chunk of pages at a time. Results are appended to the
+output (JSONL or CSV) as pages complete, and a rerun with the same output
+skips pages that were already processed.
+"""
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff", ".gif", ".pdf"}
+CSV_FIELDS = ["path", "page", "text_type", "detected_language", "extracted_text", "error"]
+
+_pipeline = None
+_options = None
+
+
+def collect_inputs(source):
+    """List image paths from a directory (recursively) or a manifest file with one path per line."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in lines]
+
+
+def completed_pages(output, fmt, retry_failed=False):
+    """Pages already present in an existing output file, as {path: {page, ...}}."""
+    if not os.path.exists(output):
+        return {}
+    done = {}
+    with open(output, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line cut short by an interruption; the page is redone
+                    continue
+        for record in records:
+            if retry_failed and record.get("error"):
+                continue
+            done.setdefault(record["path"], set()).add(int(record["page"]))
+    return done
+
+
+def init_worker(input_language, text_type, threads, pdf_chunk):
+    """Load the models once per worker process."""
+    global _pipeline, _options
+    # Read by cpu_profile when the models are loaded
+    os.environ["TORCH_NUM_THREADS"] = str(threads)
+    import pipeline
+    _pipeline = pipeline
+    _options = (input_language, text_type, pdf_chunk)
+
+
+def page_record(path, number, result):
+    return {
+        "path": path,
+        "page": number,
+        "text_type": result.get("text_type"),
+        "detected_language": result.get("detected_language"),
+        "extracted_text": result.get("extracted_text"),
+        "error": result.get("error"),
+    }
+
+
+def process_file(path, start=0, done_pages=frozenset()):
+    """
+    Extract an image, or the next pdf_chunk pages of a PDF from 0-based page
+    start, skipping pages listed in done_pages. Returns (records, start of the
+    next chunk or None once the file is finished), so only one chunk of
+    rasterized pages is held in memory and records are written per chunk.
+    """
+    input_language, text_type, pdf_chunk = _options
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:5] != b"%PDF-":
+            if 1 in done_pages:
+                return [], None
+            image = _pipeline.decode_image(data)
+            return [page_record(path, 1, _pipeline.run_extraction(image, input_language, text_type))], None
+
+        total = _pipeline.pdf_page_count(data)
+        if total == 0:
+            raise ValueError("Unsupported or corrupt PDF")
+    except Exception as e:
+        return [{"path": path, "page": start + 1, "error": str(e)}], None
+
+    end = min(total, start + pdf_chunk)
+    todo = [n for n in range(start + 1, end + 1) if n not in done_pages]
+    next_start = end if end < total else None
+    if not todo:
+        return [], next_start
+    try:
+        pages = _pipeline.rasterize_pdf(data, page_numbers=[n - 1 for n in todo])
+        results = _pipeline.run_batch_extraction(pages, input_language, text_type)
+    except Exception as e:
+        return [{"path": path, "page": n, "error": str(e)} for n in todo], next_start
+    return [page_record(path, n, result) for n, result in zip(todo, results)], next_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run text extraction over many images.")
+    parser.add_argument("source", help="Directory of images/PDFs, or a manifest file with one path per line")
+    parser.add_argument("--output", required=True, help="Output file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from the output extension)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--input-language", default="auto")
+    parser.add_argument("--text-type", default="auto", choices=["auto", "printed", "handwritten"])
+    parser.add_argument("--retry-failed", action="store_true", help="Reprocess pages that previously failed")
+    parser.add_argument("--pdf-chunk", type=int, default=8, help="PDF pages rasterized and extracted at a time")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    done = completed_pages(args.output, fmt, args.retry_failed)
+    # Finished images are skipped here; PDFs are checked page by page by the workers
+    todo = [p for p in collect_inputs(args.source)
+            if os.path.splitext(p)[1].lower() == ".pdf" or 1 not in done.get(p, ())]
+    print(f"{len(done)} files with completed pages, {len(todo)} to process")
+    if not todo:
+        return
+
+    workers = max(1, args.workers)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    write_header = fmt == "csv" and not os.path.exists(args.output)
+
+    with open(args.output, "a", encoding="utf-8", newline="") as out, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(args.input_language, args.text_type, threads, max(1, args.pdf_chunk)),
+    ) as pool:
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS) if fmt == "csv" else None
+        if write_header:
+            writer.writeheader()
+
+        # Keep a bounded number of files in flight so huge inputs stay cheap
+        remaining = iter(todo)
+        pending = {}
+        finished = 0
+        while True:
+            while len(pending) < workers * 4:
+                path = next(remaining, None)
+                if path is None:
+                    break
+                pending[pool.submit(process_file, path, 0, frozenset(done.get(path, ())))] = path
+            if not pending:
+                break
+
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                path = pending.pop(future)
+                records, next_start = future.result()
+                for record in records:
+                    if writer is not None:
+                        writer.writerow(record)
+                    else:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if next_start is not None:
+                    # Continue the PDF with its next chunk of pages
+                    pending[pool.submit(process_file, path, next_start, frozenset(done.get(path, ())))] = path
+                    continue
+                finished += 1
+                print(f"[{finished}/{len(todo)}] {path}")
+
+
+if __name__ == "__main__":
+    main()
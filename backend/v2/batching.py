@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from collections import deque
+import metrics
+
+# Cross-request micro-batching: recognition and translation calls from all
+# in-flight requests are pooled for up to MICROBATCH_WINDOW_MS (or until
+# MICROBATCH_MAX_SIZE items are waiting) and run as one batch. 0 disables it.
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "32"))
+
+
+class _Ticket:
+    """One submit() call: its items, their results and a completion signal."""
+
+    def __init__(self, items):
+        self.items = items
+        self.results = [None] * len(items)
+        self.remaining = len(items)
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers and passes them to
+    process(items) together, which must return one result per item in order.
+    A batch is dispatched when max_batch items are waiting or window seconds
+    after its oldest item arrived; every caller gets back its own results.
+    """
+
+    def __init__(self, process, window, max_batch, name="batcher"):
+        self.process = process
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._pending = deque()  # [ticket, next item index, arrival time]
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, items):
+        """Queue items and block until all of their results are available."""
+        items = list(items)
+        if not items:
+            return []
+        ticket = _Ticket(items)
+        with self._cond:
+            self._pending.append([ticket, 0, time.monotonic()])
+            self._waiting += len(items)
+            self._cond.notify()
+        ticket.done.wait()
+        if ticket.error is not None:
+            raise ticket.error
+        return ticket.results
+
+    def _take(self):
+        # Caller holds the lock; a large submission may be split over batches
+        batch = []  # (ticket, index)
+        while self._pending and len(batch) < self.max_batch:
+            entry = self._pending[0]
+            ticket, start, _ = entry
+            end = min(len(ticket.items), start + self.max_batch - len(batch))
+            batch.extend((ticket, i) for i in range(start, end))
+            if end == len(ticket.items):
+                self._pending.popleft()
+            else:
+                entry[1] = end
+        self._waiting -= len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0][2] + self.window
+                while self._waiting < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take()
+
+            try:
+                results = list(self.process([ticket.items[i] for ticket, i in batch]))
+                error = None
+                if len(results) != len(batch):
+                    # Never leave a submitter waiting for a result that will not come
+                    raise ValueError(f"Batch process returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                results, error = [None] * len(batch), e
+            self.batches += 1
+            self.items += len(batch)
+
+            for (ticket, i), result in zip(batch, results):
+                if error is not None:
+                    ticket.error = error
+                ticket.results[i] = result
+                ticket.remaining -= 1
+                if ticket.remaining == 0:
+                    ticket.done.set()
+
+
+class BatchScheduler:
+    """
+    Registry of micro-batching lanes, one per model (and language set or
+    pair), so that only calls that can share a forward pass are pooled.
+    """
+
+    def __init__(self, window_ms=MICROBATCH_WINDOW_MS, max_batch=MICROBATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.enabled = window_ms > 0
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, process, items):
+        """
+        Run process over items, pooled with other submissions to the same key.
+        process must only depend on the key, as the first submitter's process
+        serves the lane for its lifetime.
+        """
+        if not self.enabled:
+            return process(list(items))
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                name = "batch-" + "-".join(str(k) for k in key)
+                lane = self._lanes[key] = MicroBatcher(process, self.window, self.max_batch, name)
+        return lane.submit(items)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "-".join(str(k) for k in key): {
+                    "batches": lane.batches,
+                    "items": lane.items,
+                    "mean_batch_size": lane.items / lane.batches if lane.batches else 0.0,
+                }
+                for key, lane in self._lanes.items()
+            }
+
+
+scheduler = BatchScheduler()
+metrics.register_source("microbatch", lambda: {"lanes": scheduler.stats()})
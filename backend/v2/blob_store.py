@@ -0,0 +1,149 @@
+import io
+import os
+import cv2
+import hashlib
+import tempfile
+import numpy as np
+from PIL import Image
+
+# History images are downscaled to fit this box before being stored as WebP
+HISTORY_IMAGE_MAX_SIZE = int(os.getenv("HISTORY_IMAGE_MAX_SIZE", "1000"))
+WEBP_QUALITY = int(os.getenv("HISTORY_IMAGE_QUALITY", "80"))
+# Thumbnails shown in the history list
+THUMBNAIL_SIZE = int(os.getenv("HISTORY_THUMBNAIL_SIZE", "256"))
+# Legacy rows given a thumbnail per /api/thumbnails request; the rest are
+# left to later requests or to `python blob_store.py`
+THUMBNAIL_BACKFILL_LIMIT = int(os.getenv("HISTORY_THUMBNAIL_BACKFILL_LIMIT", "8"))
+
+
+def _open_rgb(image_bytes):
+    try:
+        return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    except Exception:
+        # Formats PIL cannot read may still be decodable by OpenCV
+        arr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if arr is None:
+            raise ValueError("Unsupported or corrupt image")
+        return Image.fromarray(cv2.cvtColor(arr, cv2.COLOR_BGR2RGB))
+
+
+def _encode_webp(image, max_size, quality):
+    if image.width > max_size or image.height > max_size:
+        image = image.copy()
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="WEBP", quality=quality)
+    return output.getvalue()
+
+
+def transcode_image(image_bytes, max_size=HISTORY_IMAGE_MAX_SIZE, quality=WEBP_QUALITY):
+    """Downscale an image to fit max_size and encode it as WebP."""
+    return _encode_webp(_open_rgb(image_bytes), max_size, quality)
+
+
+class BlobStore:
+    """
+    Content-addressed file store: each blob is saved once under the SHA-256
+    of its bytes, so identical images are deduplicated.
+    """
+
+    def __init__(self, root, suffix=".webp"):
+        # Absolute, so paths stay valid whatever the working directory or
+        # Flask's root_path (send_file resolves relative paths against it)
+        self.root = os.path.abspath(root)
+        self.suffix = suffix
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest + self.suffix)
+
+    def put(self, data):
+        """Store data and return its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename, so readers never see partial blobs
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def get(self, digest):
+        with open(self.path_for(digest), "rb") as f:
+            return f.read()
+
+
+image_store = BlobStore(os.getenv("BLOB_DIR", "blobs"))
+
+
+def store_history_image(image_bytes):
+    """
+    Transcode an uploaded image for the history and store it together with
+    its thumbnail. Returns (image_hash, thumb_hash).
+    """
+    # Decode once and encode both sizes from the same image
+    image = _open_rgb(image_bytes)
+    image_data = _encode_webp(image, HISTORY_IMAGE_MAX_SIZE, WEBP_QUALITY)
+    thumb_data = _encode_webp(image, THUMBNAIL_SIZE, WEBP_QUALITY)
+    return image_store.put(image_data), image_store.put(thumb_data)
+
+
+def backfill_thumbnail(conn, row_id):
+    """
+    Create the thumbnail of a history row stored before thumbnails existed.
+    Returns its digest, or None when the row has no readable image.
+    """
+    row = conn.execute(
+        "SELECT image_hash, image_data FROM extract_history WHERE id = ?", (row_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    try:
+        if row["image_hash"] is not None:
+            source = image_store.get(row["image_hash"])
+        elif row["image_data"] is not None:
+            source = row["image_data"]
+        else:
+            return None
+        digest = image_store.put(transcode_image(source, THUMBNAIL_SIZE))
+    except (OSError, ValueError):
+        return None
+    with conn:
+        conn.execute("UPDATE extract_history SET thumb_hash = ? WHERE id = ?", (digest, row_id))
+    return digest
+
+
+def migrate_history_images(conn):
+    """
+    Move images still stored as BLOBs in extract_history into the blob store
+    and create missing thumbnails.
+    """
+    rows = conn.execute(
+        "SELECT id, image_data FROM extract_history WHERE image_hash IS NULL AND image_data IS NOT NULL"
+    ).fetchall()
+    for row in rows:
+        try:
+            image_hash, thumb_hash = store_history_image(row["image_data"])
+        except ValueError:
+            continue
+        with conn:
+            conn.execute(
+                "UPDATE extract_history SET image_hash = ?, thumb_hash = ?, image_data = NULL WHERE id = ?",
+                (image_hash, thumb_hash, row["id"])
+            )
+
+    missing = conn.execute(
+        "SELECT id FROM extract_history WHERE thumb_hash IS NULL AND image_hash IS NOT NULL"
+    ).fetchall()
+    for row in missing:
+        backfill_thumbnail(conn, row["id"])
+    return len(rows) + len(missing)
+
+
+if __name__ == "__main__":
+    from database import get_db
+    print(f"Migrated {migrate_history_images(get_db())} history rows")
@@ -0,0 +1,120 @@
+"""
+Check that is_printed_crop makes the same printed/handwritten decisions as
+the original classifier it replaced.
+
+    python check_text_type.py crops/ more_crops/line.png
+    python check_text_type.py --synthetic 500
+
+Every image (directories are searched recursively) is classified by both
+implementations on the same grayscale input; --synthetic adds generated
+crops of printed and scribbled text at varied sizes, contrast and blur.
+Prints the features of any crop where they disagree and exits with status 1.
+"""
+import os
+import sys
+import argparse
+
+import cv2
+import numpy as np
+
+from extract_util import is_printed_crop
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
+
+
+def original_features(img):
+    """The original (pre-optimization) feature computation, kept verbatim."""
+    blur = cv2.GaussianBlur(img, (3, 3), 0)
+    sobel_x = cv2.Sobel(blur, cv2.CV_64F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(blur, cv2.CV_64F, 0, 1, ksize=3)
+    sobel_mag = np.sqrt(sobel_x**2 + sobel_y**2)
+    edge_mean = np.mean(sobel_mag)
+
+    lap = cv2.Laplacian(img, cv2.CV_64F)
+    lap_var = lap.var()
+
+    gx = cv2.Sobel(img, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(img, cv2.CV_32F, 0, 1)
+    mag = cv2.magnitude(gx, gy)
+    grad_energy = np.mean(mag)
+    return edge_mean, lap_var, grad_energy
+
+
+def original_is_printed(img):
+    edge_mean, lap_var, grad_energy = original_features(img)
+    printed_score = int(edge_mean > 108) + int(lap_var > 1800) + int(grad_energy > 165)
+    return printed_score > 3 - printed_score
+
+
+def load_crops(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        yield from load_crops([os.path.join(root, name)])
+            continue
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            print(f"Skipping unreadable {path}")
+            continue
+        yield path, img
+
+
+def synthetic_crops(count, seed=0):
+    """Printed (putText) and handwriting-like (random strokes) crops."""
+    rng = np.random.default_rng(seed)
+    fonts = [cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX, cv2.FONT_HERSHEY_COMPLEX,
+             cv2.FONT_HERSHEY_SCRIPT_SIMPLEX]
+    for i in range(count):
+        height = int(rng.integers(16, 96))
+        width = int(height * rng.uniform(2, 12))
+        background = int(rng.integers(150, 256))
+        ink = int(rng.integers(0, max(1, background - 40)))
+        img = np.full((height, width), background, np.uint8)
+        if i % 2 == 0:
+            text = "".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz0123456789 "), int(rng.integers(3, 20))))
+            scale = height / 40
+            cv2.putText(img, text, (2, int(height * 0.75)), fonts[i // 2 % len(fonts)], scale, ink,
+                        max(1, int(scale * 2)), cv2.LINE_AA)
+        else:
+            points = np.cumsum(rng.normal(0, height / 6, (int(rng.integers(10, 60)), 2)), axis=0)
+            points = (points - points.min(axis=0)) / (np.ptp(points, axis=0) + 1e-6)
+            points = (points * [width - 4, height - 4] + 2).astype(np.int32)
+            cv2.polylines(img, [points], False, ink, int(rng.integers(1, 4)), cv2.LINE_AA)
+        if rng.random() < 0.5:
+            k = int(rng.choice([3, 5]))
+            img = cv2.GaussianBlur(img, (k, k), 0)
+        noise = rng.normal(0, rng.uniform(0, 12), img.shape)
+        yield f"synthetic-{i}", np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare is_printed_crop with the original classifier.")
+    parser.add_argument("paths", nargs="*", help="Crop images or directories of crops")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of generated crops to add")
+    args = parser.parse_args()
+    if not args.paths and not args.synthetic:
+        parser.error("give crop paths and/or --synthetic N")
+
+    crops = list(load_crops(args.paths))
+    crops += list(synthetic_crops(args.synthetic))
+
+    mismatches = 0
+    printed = 0
+    for name, img in crops:
+        expected = original_is_printed(img)
+        actual = bool(is_printed_crop(img))
+        printed += expected
+        if actual != expected:
+            mismatches += 1
+            edge_mean, lap_var, grad_energy = original_features(img)
+            print(f"MISMATCH {name}: original={expected} new={actual} "
+                  f"edge_mean={edge_mean:.6f} lap_var={lap_var:.6f} grad_energy={grad_energy:.6f}")
+
+    print(f"{len(crops)} crops ({printed} printed, {len(crops) - printed} handwritten), {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import os
+import re
+import threading
+
+# CPU inference profile for the transformer models (TrOCR, MarianMT).
+# QUANTIZE_MODELS=1 swaps every nn.Linear for a dynamically quantized int8
+# Linear; the quantized modules are cached on disk so restarts skip both the
+# fp32 load and the quantization pass.
+QUANTIZE_MODELS = os.getenv("QUANTIZE_MODELS", "0") == "1"
+QUANTIZED_CACHE_DIR = os.getenv("QUANTIZED_CACHE_DIR", "quantized_cache")
+
+
+def _default_intra_op_threads():
+    # Every gunicorn thread may run inference at the same time; give each its
+    # share of the cores instead of letting all of them spawn one thread per core
+    workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+    threads = int(os.getenv("GUNICORN_THREADS", "1"))
+    return max(1, (os.cpu_count() or 1) // max(1, workers * threads))
+
+
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS") or _default_intra_op_threads())
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+
+_threads_lock = threading.Lock()
+_threads_configured = False
+
+
+def configure_threads():
+    """Apply the torch intra-op and inter-op thread counts once per process."""
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        import torch
+        torch.set_num_threads(TORCH_NUM_THREADS)
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            # Only allowed before the first inter-op parallel call
+            print("Inter-op thread count already fixed; keeping the torch default")
+        _threads_configured = True
+
+
+def model_nbytes(module):
+    """Approximate resident size of a torch module, including int8 packed weights."""
+    if module is None:
+        return 0
+    import torch
+    if not isinstance(module, torch.nn.Module):
+        # ONNX Runtime models: approximate by the size of their weight files
+        save_dir = getattr(module, "model_save_dir", None)
+        if save_dir is None:
+            return 0
+        return sum(e.stat().st_size for e in os.scandir(save_dir) if ".onnx" in e.name)
+    tensors = list(module.parameters()) + list(module.buffers())
+    for m in module.modules():
+        # Dynamically quantized Linear layers keep their weights outside parameters()
+        if isinstance(m, torch.ao.nn.quantized.dynamic.Linear):
+            tensors.append(m.weight())
+            if m.bias() is not None:
+                tensors.append(m.bias())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _cache_path(name):
+    import torch
+    import transformers
+    key = f"{name}-torch{torch.__version__}-transformers{transformers.__version__}"
+    return os.path.join(QUANTIZED_CACHE_DIR, re.sub(r"[^\w.-]", "_", key) + ".pt")
+
+
+def load_model(name, loader, quantize=None):
+    """
+    Return loader()'s model in eval mode, prepared for CPU inference.
+    With quantization enabled its Linear layers run in int8 and the result is
+    read from (or written to) the on-disk cache under the given model name.
+    """
+    import torch
+    configure_threads()
+    quantize = QUANTIZE_MODELS if quantize is None else quantize
+    if not quantize:
+        model = loader()
+        model.eval()
+        return model
+
+    path = _cache_path(name)
+    if os.path.exists(path):
+        try:
+            model = torch.load(path, weights_only=False)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f"Ignoring unreadable quantized cache {path}: {e}")
+
+    model = loader()
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    os.makedirs(QUANTIZED_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, tmp)
+    os.replace(tmp, path)
+    return model
@@ -1,15 +1,20 @@
+import os
 import sqlite3
+import threading
 
-def get_db():
-    conn = sqlite3.connect("users.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+DB_PATH = os.getenv("DATABASE_PATH", "users.db")
+# How long a writer waits for a competing write lock before "database is locked"
+BUSY_TIMEOUT_MS = int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", "5000"))
 
-def init_db():
-    conn = get_db()
-    cursor = conn.cursor()
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated = False
 
-    cursor.execute("""
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: base schema
+    [
+        """
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
@@ -17,9 +22,8 @@ def init_db():
             password_hash TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-
-    cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS extract_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -29,9 +33,8 @@ def init_db():
             text_type TEXT,
             language TEXT
         )
-    """)
-
-    cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS translate_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -41,10 +44,85 @@ def init_db():
             input_language TEXT,
             output_language TEXT
         )
-    """)
+        """,
+    ],
+    # 2: history is always filtered by user and sorted (or looked up) by timestamp
+    [
+        "CREATE INDEX IF NOT EXISTS idx_extract_history_user_ts ON extract_history (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_translate_history_user_ts ON translate_history (user_id, timestamp)",
+    ],
+    # 3: images live in the content-addressed blob store; rows keep only the hash
+    [
+        "ALTER TABLE extract_history ADD COLUMN image_hash TEXT",
+    ],
+    # 4: small WebP thumbnail for the history list, also in the blob store
+    [
+        "ALTER TABLE extract_history ADD COLUMN thumb_hash TEXT",
+    ],
+]
+
+
+def _connect(**kwargs):
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=256, **kwargs)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    # WAL lets readers proceed while a writer commits
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
 
-    conn.commit()
-    conn.close()
+
+def migrate():
+    """
+    Apply pending schema migrations in one transaction. The write lock is
+    taken before user_version is read, so processes starting together apply
+    each migration once, and a failing step leaves the schema untouched.
+    """
+    # Autocommit mode: the sqlite3 module would otherwise commit around DDL
+    conn = _connect(isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for sql in statements:
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def get_db():
+    """
+    Return this thread's SQLite connection, opening it on first use.
+    The connection is reused across requests, so callers must not close it;
+    wrap writes in `with conn:` so they are committed or rolled back.
+    """
+    global _migrated
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+        if not _migrated:
+            with _migrate_lock:
+                if not _migrated:
+                    migrate()
+                    _migrated = True
+    return conn
+
+
+def release_db():
+    """Roll back a transaction left open by a failed request on this thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def init_db():
+    migrate()
 
 if __name__ == "__main__":
     init_db()
@@ -1,11 +1,16 @@
 import os
 import time
+import queue
+import threading
 import cv2
+from contextlib import contextmanager
 from craft_text_detector import Craft, craft_utils
 import craft_text_detector
 from craft_text_detector import image_utils, torch_utils
-from PIL import Image
 import numpy as np
+import cpu_profile
+import onnx_engine
+import metrics
 
 
 # PATCH 1: Fix adjustResultCoordinates
@@ -34,11 +39,18 @@ def safe_get_prediction(
     cuda: bool = False,
     long_size: int = 1280,
     poly: bool = True,
+    lean: bool = False,
 ):
-    t0 = time.time()
+    """
+    CRAFT prediction. With lean=True only boxes (and polys when poly=True) are
+    returned; ratio arrays and heatmap colorization are skipped.
+    """
+    t_start = t0 = time.time()
 
     # read/convert image
     image = image_utils.read_image(image)
+    read_time = time.time() - t0
+    t0 = time.time()
 
     # resize
     img_resized, target_ratio, size_heatmap = image_utils.resize_aspect_ratio(
@@ -82,84 +94,194 @@ def safe_get_prediction(
 
     # coordinate adjustment
     boxes = craft_utils.adjustResultCoordinates(boxes, ratio_w, ratio_h)
-    polys = craft_utils.adjustResultCoordinates(polys, ratio_w, ratio_h)
-    for k in range(len(polys)):
-        if polys[k] is None:
-            polys[k] = boxes[k]
-
-    # get image size
-    img_height = image.shape[0]
-    img_width = image.shape[1]
-
-    # calculate box coords as ratios to image size
-    boxes_as_ratio = []
-    for box in boxes:
-        boxes_as_ratio.append(box / [img_width, img_height])
-    boxes_as_ratio = np.array(boxes_as_ratio)
-
-    # calculate poly coords as ratios to image size
-    polys_as_ratio = []
-    for poly_item in polys:
-        polys_as_ratio.append(poly_item / [img_width, img_height])
-
-    # Key modification: Allow each poly shape to be different and use dtype=object to avoid crashes
-    polys_as_ratio = np.array(polys_as_ratio, dtype=object)
-
-    text_score_heatmap = image_utils.cvt2HeatmapImg(score_text)
-    link_score_heatmap = image_utils.cvt2HeatmapImg(score_link)
+    if lean and not poly:
+        polys = None
+    else:
+        polys = craft_utils.adjustResultCoordinates(polys, ratio_w, ratio_h)
+        for k in range(len(polys)):
+            if polys[k] is None:
+                polys[k] = boxes[k]
+
+    result = {"boxes": boxes, "polys": polys}
+    if not lean:
+        # get image size
+        img_height = image.shape[0]
+        img_width = image.shape[1]
+
+        # calculate box coords as ratios to image size
+        boxes_as_ratio = []
+        for box in boxes:
+            boxes_as_ratio.append(box / [img_width, img_height])
+        boxes_as_ratio = np.array(boxes_as_ratio)
+
+        # calculate poly coords as ratios to image size
+        polys_as_ratio = []
+        for poly_item in polys:
+            polys_as_ratio.append(poly_item / [img_width, img_height])
+
+        # Key modification: Allow each poly shape to be different and use dtype=object to avoid crashes
+        polys_as_ratio = np.array(polys_as_ratio, dtype=object)
+
+        text_score_heatmap = image_utils.cvt2HeatmapImg(score_text)
+        link_score_heatmap = image_utils.cvt2HeatmapImg(score_link)
+
+        result["boxes_as_ratios"] = boxes_as_ratio
+        result["polys_as_ratios"] = polys_as_ratio
+        result["heatmaps"] = {
+            "text_score_heatmap": text_score_heatmap,
+            "link_score_heatmap": link_score_heatmap,
+        }
 
     postprocess_time = time.time() - t0
 
-    times = {
+    result["times"] = {
+        "read_time": read_time,
         "resize_time": resize_time,
         "preprocessing_time": preprocessing_time,
         "craftnet_time": craftnet_time,
         "refinenet_time": refinenet_time,
         "postprocess_time": postprocess_time,
+        "total_time": time.time() - t_start,
     }
-
-    return {
-        "boxes": boxes,
-        "boxes_as_ratios": boxes_as_ratio,
-        "polys": polys,
-        "polys_as_ratios": polys_as_ratio,
-        "heatmaps": {
-            "text_score_heatmap": text_score_heatmap,
-            "link_score_heatmap": link_score_heatmap,
-        },
-        "times": times,
-    }
+    return result
 
 craft_text_detector.get_prediction = safe_get_prediction
 # END PATCH 2
 
 
-def detect_and_crop(input_image_path, out_dir="crops", min_area=100):
+class CraftDetector:
     """
-    Uses craft_text_detector to detect text regions and saves crops.
-    Returns list of crop file paths.
+    Long-lived CRAFT detector. Weights are loaded once and kept in a small pool
+    of replicas; each call borrows one replica, so concurrent requests never
+    share a network mid-inference.
     """
-    os.makedirs(out_dir, exist_ok=True)
-    craft = Craft(output_dir=None)
+
+    def __init__(self, replicas=1, warmup_size=256, **craft_kwargs):
+        self.replicas = max(1, replicas)
+        self._pool = queue.Queue()
+        for _ in range(self.replicas):
+            craft = Craft(output_dir=None, **craft_kwargs)
+            if onnx_engine.USE_ONNX:
+                onnx_engine.use_onnx_craft(craft)
+            self._pool.put(craft)
+        self._timing_lock = threading.Lock()
+        self.calls = 0
+        self.last_times = {}
+        self.total_times = {}
+        if warmup_size:
+            self.warm_up(warmup_size)
+
+    @contextmanager
+    def acquire(self):
+        craft = self._pool.get()
+        try:
+            yield craft
+        finally:
+            self._pool.put(craft)
+
+    def warm_up(self, size=256):
+        """Run one dummy inference per replica to trigger lazy allocations."""
+        blank = np.full((size, size, 3), 255, dtype=np.uint8)
+        crafts = [self._pool.get() for _ in range(self.replicas)]
+        try:
+            for craft in crafts:
+                self._predict(craft, blank, poly=False)
+        finally:
+            for craft in crafts:
+                self._pool.put(craft)
+
+    @staticmethod
+    def _predict(craft, image, poly):
+        return safe_get_prediction(
+            image=image,
+            craft_net=craft.craft_net,
+            refine_net=craft.refine_net,
+            text_threshold=craft.text_threshold,
+            link_threshold=craft.link_threshold,
+            low_text=craft.low_text,
+            cuda=craft.cuda,
+            long_size=craft.long_size,
+            poly=poly,
+            lean=True,
+        )
+
+    def detect_text(self, image, poly=False):
+        """
+        Lean detection: returns {"boxes", "polys", "times"}; polys is None
+        unless poly=True.
+        """
+        with self.acquire() as craft:
+            prediction = self._predict(craft, image, poly)
+        self._record(prediction["times"])
+        return prediction
+
+    def _record(self, times):
+        for stage, seconds in times.items():
+            metrics.observe_stage("craft_" + stage.replace("_time", ""), seconds)
+        with self._timing_lock:
+            self.calls += 1
+            self.last_times = dict(times)
+            for stage, seconds in times.items():
+                self.total_times[stage] = self.total_times.get(stage, 0.0) + seconds
+
+    def timing_report(self):
+        """Per-stage timings (seconds) of the last call and cumulative totals/means."""
+        with self._timing_lock:
+            calls = self.calls
+            return {
+                "calls": calls,
+                "last": dict(self.last_times),
+                "total": dict(self.total_times),
+                "mean": {k: v / calls for k, v in self.total_times.items()} if calls else {},
+            }
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """Return the process-wide CraftDetector, creating it on first use."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                cpu_profile.configure_threads()
+                t0 = time.time()
+                _detector = CraftDetector(
+                    replicas=int(os.getenv("CRAFT_REPLICAS", "1")),
+                    warmup_size=int(os.getenv("CRAFT_WARMUP_SIZE", "256")),
+                )
+                metrics.record_model_load("craft", time.time() - t0)
+    return _detector
+
+
+def detect_and_crop(image, min_area=100, debug_dir=None, return_boxes=False):
+    """
+    Uses craft_text_detector to detect text regions in an RGB image array.
+    Returns list of crops as array views into the image, in reading order.
+    With return_boxes=True, returns (crops, boxes) where each box is the
+    [x0, y0, x1, y1] pixel rectangle of the matching crop.
+    Crops are only written to disk when debug_dir is given.
+    """
+    img = image_utils.read_image(image)
     try:
-        prediction = craft.detect_text(input_image_path)
+        prediction = get_detector().detect_text(img)
     except Exception as e:
-        craft = None
         raise RuntimeError(f"CRAFT detect_text failed: {e}")
 
     if not prediction or "boxes" not in prediction:
-        craft = None
-        return []
+        return ([], []) if return_boxes else []
 
     boxes = prediction.get("boxes", [])
     if not boxes:
-        return []
+        return ([], []) if return_boxes else []
     
     # Line grouping + sorting
     boxes = sort_into_lines(boxes)
-    crop_paths = []
-    img = Image.open(input_image_path).convert("RGB")
-    width, height = img.size  # PIL Image.size -> (width, height)
+    crops = []
+    crop_boxes = []
+    height, width = img.shape[:2]
 
     for i, box in enumerate(boxes):
         # Each box contains 4 corner points: [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
@@ -178,13 +300,23 @@ def detect_and_crop(input_image_path, out_dir="crops", min_area=100):
         if (x1 - x0) * (y1 - y0) < min_area:
             continue
 
-        crop = img.crop((x0, y0, x1, y1))
-        crop_path = os.path.join(out_dir, f"crop_{i}.png")
-        crop.save(crop_path)
-        crop_paths.append(crop_path)
+        crop = img[y0:y1, x0:x1]
+        if debug_dir:
+            save_debug_image(crop, os.path.join(debug_dir, f"crop_{i}.png"))
+        crops.append(crop)
+        crop_boxes.append([x0, y0, x1, y1])
+
+    if debug_dir:
+        save_debug_image(img, os.path.join(debug_dir, "input.png"))
+    if return_boxes:
+        return crops, crop_boxes
+    return crops
+
 
-    craft = None
-    return crop_paths
+def save_debug_image(rgb, path):
+    """Write an RGB array to disk for debugging."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
 
 
 def box_stats(box):
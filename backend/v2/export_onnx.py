@@ -0,0 +1,171 @@
+"""
+Export the models to ONNX and check the ONNX Runtime engine against PyTorch.
+
+    python export_onnx.py export --pairs en-zh,zh-en
+    python export_onnx.py bench sample.png --pairs en-zh
+
+`export` converts CRAFT, TrOCR and the given MarianMT pairs once into
+ONNX_MODEL_DIR (the server exports missing models on first use as well).
+`bench` runs every stage with both engines on the same inputs, prints the
+latency per stage and the difference between the outputs, and exits with
+status 1 if any stage is outside the tolerance.
+"""
+import sys
+import time
+import argparse
+
+import onnx_engine
+from translation_model import parse_pairs
+
+# Sample sentences for the MarianMT comparison
+BENCH_SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Please send the signed contract back before Friday.",
+    "Text extraction works best on well lit, high resolution scans.",
+]
+
+
+def load_craft():
+    from craft_text_detector import Craft
+    return Craft(output_dir=None)
+
+
+def export(args):
+    if not args.skip_craft:
+        paths = onnx_engine.export_craft(load_craft(), force=args.force)
+        print("CRAFT:", ", ".join(p for p in paths if p))
+    if not args.skip_trocr:
+        from extract_util import TROCR_MODEL_NAME
+        print("TrOCR:", onnx_engine.export_seq2seq(TROCR_MODEL_NAME, "vision2seq", force=args.force))
+    for src, tgt in parse_pairs(args.pairs):
+        name = f"Helsinki-NLP/opus-mt-{src}-{tgt}"
+        print("MarianMT:", onnx_engine.export_seq2seq(name, "seq2seq", force=args.force))
+
+
+def timed(fn, repeat):
+    """Run fn repeat times; return (last result, mean seconds)."""
+    result = fn()  # warm-up
+    repeat = max(1, repeat)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def char_error_rate(predictions, references):
+    import jiwer
+    pairs = [(p, r) for p, r in zip(predictions, references) if r]
+    if not pairs:
+        return 0.0
+    return jiwer.cer([r for _, r in pairs], [p for p, _ in pairs])
+
+
+def bench(args):
+    import cv2
+    import torch
+    from craft_text_detector import image_utils
+    from detect_and_crop import safe_get_prediction, sort_into_lines
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel, MarianMTModel, MarianTokenizer
+    from extract_util import TROCR_MODEL_NAME
+    from translation_model import translate_segments
+
+    rows = []
+    failed = False
+
+    def report(stage, torch_s, onnx_s, diff, limit):
+        nonlocal failed
+        ok = diff <= limit
+        failed |= not ok
+        rows.append((stage, torch_s * 1000, onnx_s * 1000, torch_s / onnx_s if onnx_s else 0.0, diff, limit, ok))
+
+    # CRAFT: same preprocessed input through both networks
+    image = image_utils.read_image(args.image)
+    torch_craft = load_craft()
+    onnx_craft = onnx_engine.use_onnx_craft(load_craft())
+    resized, _, _ = image_utils.resize_aspect_ratio(image, torch_craft.long_size, interpolation=cv2.INTER_LINEAR)
+    x = torch.from_numpy(image_utils.normalizeMeanVariance(resized)).permute(2, 0, 1).unsqueeze(0)
+    with torch.no_grad():
+        (y_torch, _), t_torch = timed(lambda: torch_craft.craft_net(x), args.repeat)
+    (y_onnx, _), t_onnx = timed(lambda: onnx_craft.craft_net(x), args.repeat)
+    report("craft_net", t_torch, t_onnx, float((y_torch - y_onnx).abs().max()), args.score_tolerance)
+
+    def detect(craft):
+        return safe_get_prediction(
+            image=image, craft_net=craft.craft_net, refine_net=craft.refine_net,
+            long_size=craft.long_size, poly=False, lean=True,
+        )
+    det_torch, t_torch = timed(lambda: detect(torch_craft), args.repeat)
+    det_onnx, t_onnx = timed(lambda: detect(onnx_craft), args.repeat)
+    report("craft_detect (boxes)", t_torch, t_onnx,
+           abs(len(det_torch["boxes"]) - len(det_onnx["boxes"])), 0)
+
+    # TrOCR: crops from the PyTorch detection, decoded by both engines
+    crops = []
+    for box in sort_into_lines(det_torch["boxes"]):
+        xs = [int(pt[0]) for pt in box]
+        ys = [int(pt[1]) for pt in box]
+        crop = image[max(0, min(ys)):max(ys), max(0, min(xs)):max(xs)]
+        if crop.size:
+            crops.append(crop)
+    crops = crops[:args.max_lines]
+    if crops:
+        processor = TrOCRProcessor.from_pretrained(TROCR_MODEL_NAME)
+        torch_model = VisionEncoderDecoderModel.from_pretrained(TROCR_MODEL_NAME).eval()
+        onnx_model = onnx_engine.load_seq2seq(TROCR_MODEL_NAME, "vision2seq")
+        pixel_values = processor(images=crops, return_tensors="pt").pixel_values
+
+        def recognize(model):
+            with torch.no_grad():
+                return processor.batch_decode(model.generate(pixel_values), skip_special_tokens=True)
+        texts_torch, t_torch = timed(lambda: recognize(torch_model), args.repeat)
+        texts_onnx, t_onnx = timed(lambda: recognize(onnx_model), args.repeat)
+        report(f"trocr ({len(crops)} lines, CER)", t_torch, t_onnx,
+               char_error_rate(texts_onnx, texts_torch), args.cer_tolerance)
+
+    # MarianMT
+    for src, tgt in parse_pairs(args.pairs):
+        name = f"Helsinki-NLP/opus-mt-{src}-{tgt}"
+        tokenizer = MarianTokenizer.from_pretrained(name)
+        torch_model = MarianMTModel.from_pretrained(name).eval()
+        onnx_model = onnx_engine.load_seq2seq(name, "seq2seq")
+        out_torch, t_torch = timed(lambda: translate_segments(BENCH_SENTENCES, tokenizer, torch_model), args.repeat)
+        out_onnx, t_onnx = timed(lambda: translate_segments(BENCH_SENTENCES, tokenizer, onnx_model), args.repeat)
+        report(f"marian {src}-{tgt} (CER)", t_torch, t_onnx,
+               char_error_rate(out_onnx, out_torch), args.cer_tolerance)
+
+    print(f"{'stage':<28}{'torch ms':>10}{'onnx ms':>10}{'speedup':>9}{'diff':>10}{'limit':>8}")
+    for stage, torch_ms, onnx_ms, speedup, diff, limit, ok in rows:
+        print(f"{stage:<28}{torch_ms:>10.1f}{onnx_ms:>10.1f}{speedup:>8.2f}x{diff:>10.4f}{limit:>8.3g}"
+              + ("" if ok else "  FAIL"))
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models to ONNX and compare the ONNX engine with PyTorch.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export the models into ONNX_MODEL_DIR")
+    export_parser.add_argument("--pairs", default="", help="MarianMT pairs to export, e.g. en-zh,zh-en")
+    export_parser.add_argument("--skip-craft", action="store_true")
+    export_parser.add_argument("--skip-trocr", action="store_true")
+    export_parser.add_argument("--force", action="store_true", help="Re-export models that already exist")
+
+    bench_parser = commands.add_parser("bench", help="Compare latency and outputs of both engines")
+    bench_parser.add_argument("image", help="Image used for CRAFT and TrOCR")
+    bench_parser.add_argument("--pairs", default="", help="MarianMT pairs to compare, e.g. en-zh")
+    bench_parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage")
+    bench_parser.add_argument("--max-lines", type=int, default=16, help="Line crops decoded by TrOCR")
+    bench_parser.add_argument("--score-tolerance", type=float, default=1e-3,
+                              help="Maximum absolute difference of the CRAFT score maps")
+    bench_parser.add_argument("--cer-tolerance", type=float, default=0.01,
+                              help="Maximum character error rate of ONNX outputs against PyTorch outputs")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args)
+        return 0
+    return bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,156 @@
+import os
 import cv2
+import time
 import torch
 import easyocr
+import threading
 import numpy as np
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+from model_cache import ModelCache
+import cpu_profile
+import onnx_engine
+from batching import scheduler
+import metrics
+from easyocr import config as easyocr_config
+from easyocr.recognition import get_text
+from easyocr.utils import compute_ratio_and_resize
+from translation_model import detect_text_language_auto
 
-# Load TrOCR
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
-model.eval()
+TROCR_MODEL_NAME = "microsoft/trocr-base-handwritten"
+_trocr = None
+_trocr_lock = threading.Lock()
 
-def run_trocr(image_path):
-    """Perform TrOCR inference on a single image."""
-    img = cv2.imread(image_path)
-    if img is None:
-        return ""
 
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    pixel_values = processor(images=img, return_tensors="pt").pixel_values
+def get_trocr():
+    """Return the shared TrOCR (processor, model), loading it on first use."""
+    global _trocr
+    if _trocr is None:
+        with _trocr_lock:
+            if _trocr is None:
+                from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+                t0 = time.time()
+                processor = TrOCRProcessor.from_pretrained(TROCR_MODEL_NAME)
+                if onnx_engine.USE_ONNX:
+                    model = onnx_engine.load_seq2seq(TROCR_MODEL_NAME, "vision2seq")
+                else:
+                    model = cpu_profile.load_model(
+                        TROCR_MODEL_NAME, lambda: VisionEncoderDecoderModel.from_pretrained(TROCR_MODEL_NAME)
+                    )
+                _trocr = (processor, model)
+                metrics.record_model_load("trocr", time.time() - t0)
+    return _trocr
 
-    with torch.no_grad():
-        generated_ids = model.generate(pixel_values)
 
-    text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-    return text.strip()
+def trocr_loaded():
+    return _trocr is not None
+
+
+# Maximum number of line images decoded by a single generate call
+TROCR_MAX_BATCH = int(os.getenv("TROCR_MAX_BATCH", "8"))
+
+
+def _sequence_confidences(model, generated, pad_token_id):
+    """Per-sequence confidence: geometric mean probability of the generated tokens."""
+    scores = model.compute_transition_scores(generated.sequences, generated.scores, normalize_logits=True)
+    tokens = generated.sequences[:, 1:]
+    mask = (tokens != pad_token_id).float()
+    mean_logprob = (scores * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return mean_logprob.exp().tolist()
+
+
+def run_trocr_batch(images, max_batch=TROCR_MAX_BATCH, on_batch=None, ordered=False, first_batch=None):
+    """
+    Perform batched TrOCR inference on a list of RGB image arrays.
+    Returns one string per image, in the same order as the input.
+    on_batch(indices, texts, confidences) is called after every batch with the
+    input indices it recognized. By default lines are grouped by aspect ratio
+    for throughput; ordered=True keeps batches in input (reading) order and
+    first_batch caps the size of the first batch, so the first lines are
+    available sooner when streaming.
+    """
+    results = [""] * len(images)
+    valid = [i for i, img in enumerate(images) if img is not None and img.size > 0]
+    if on_batch is not None and len(valid) < len(images):
+        empty = sorted(set(range(len(images))) - set(valid))
+        on_batch(empty, [""] * len(empty), [0.0] * len(empty))
+
+    if not ordered:
+        # Lines with similar aspect ratios decode to similar lengths, so batching
+        # them together keeps the number of padded decode steps low
+        valid.sort(key=lambda i: images[i].shape[1] / images[i].shape[0])
+
+    batches = []
+    start = 0
+    while start < len(valid):
+        size = first_batch if first_batch and not batches else max_batch
+        batches.append(valid[start:start + size])
+        start += size
+
+    if not batches:
+        return results
+
+    processor, model = get_trocr()
+    pad_token_id = processor.tokenizer.pad_token_id
+    for batch in batches:
+        pixel_values = processor(images=[images[i] for i in batch], return_tensors="pt").pixel_values
+
+        with torch.no_grad():
+            generated = model.generate(pixel_values, output_scores=True, return_dict_in_generate=True)
+
+        texts = processor.batch_decode(generated.sequences, skip_special_tokens=True)
+        for i, text in zip(batch, texts):
+            results[i] = text.strip()
+        if on_batch is not None:
+            on_batch(batch, [results[i] for i in batch], _sequence_confidences(model, generated, pad_token_id))
+
+    return results
+
+
+def run_trocr(img):
+    """Perform TrOCR inference on a single RGB image array."""
+    return run_trocr_batch([img])[0]
+
+
+def _trocr_lane(crops):
+    results = [None] * len(crops)
+
+    def collect(indices, texts, confidences):
+        for i, text, confidence in zip(indices, texts, confidences):
+            results[i] = (text, confidence)
+
+    run_trocr_batch(crops, on_batch=collect)
+    return results
+
+
+@metrics.stage("trocr")
+def recognize_handwritten(crops, on_batch=None, ordered=False, first_batch=None):
+    """
+    Same contract as run_trocr_batch, but with micro-batching enabled the lines
+    are decoded together with those of concurrent requests. With ordered=True
+    they are submitted in reading-order chunks so streaming still gets the
+    first lines early.
+    """
+    if not scheduler.enabled:
+        return run_trocr_batch(crops, on_batch=on_batch, ordered=ordered, first_batch=first_batch)
+
+    indices = list(range(len(crops)))
+    if ordered:
+        chunks = []
+        start = 0
+        while start < len(indices):
+            size = first_batch if first_batch and not chunks else TROCR_MAX_BATCH
+            chunks.append(indices[start:start + size])
+            start += size
+    else:
+        chunks = [indices]
+
+    texts = [""] * len(crops)
+    for chunk in chunks:
+        results = scheduler.submit(("trocr",), _trocr_lane, [crops[i] for i in chunk])
+        for i, (text, _) in zip(chunk, results):
+            texts[i] = text
+        if on_batch is not None:
+            on_batch(chunk, [text for text, _ in results], [conf for _, conf in results])
+    return texts
 
 
 # EasyOCR supported languages (80+ languages)
@@ -37,84 +165,284 @@ def run_trocr(image_path):
 # ]
 EASYOCR_SUPPORTED_LANGS = ['en', 'ch_sim', 'ru']
 
-def detect_img_language_auto(crop_path):
+
+class ReaderPool:
     """
-    Traverse all EasyOCR supported languages to determine the highest-scoring language for the text in crop_path[0].
+    Process-wide registry of easyocr.Reader instances keyed by language set.
+    Readers are loaded lazily on first use, shared across threads and evicted
+    in LRU order once either max_readers or max_bytes is exceeded.
     """
-    best_lang = "en"
-    best_score = -1
-    for lang in EASYOCR_SUPPORTED_LANGS:
-        try:
-            reader = easyocr.Reader([lang], gpu=False)
-            result = reader.readtext(crop_path[0], detail=1)
-            if not result:
-                continue
 
-            score = result[0][2]
-            if score > best_score:
-                best_score = score
-                best_lang = lang
+    def __init__(self, max_readers=4, max_bytes=None, gpu=False):
+        self.gpu = gpu
+        self._cache = ModelCache(max_entries=max_readers, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.load_time = 0.0
 
-        except Exception:
+    @staticmethod
+    def make_key(langs):
+        # Keep the caller's order (EasyOCR builds its charset from it) but drop duplicates
+        return tuple(dict.fromkeys(langs))
+
+    def get(self, langs):
+        key = self.make_key(langs)
+        return self._cache.get(key, lambda: self._load(key))
+
+    def _load(self, key):
+        cpu_profile.configure_threads()
+        t0 = time.time()
+        reader = easyocr.Reader(list(key), gpu=self.gpu)
+        elapsed = time.time() - t0
+        metrics.record_model_load("easyocr:" + "+".join(key), elapsed)
+        with self._lock:
+            self.load_time += elapsed
+        nbytes = cpu_profile.model_nbytes(getattr(reader, "detector", None)) + \
+            cpu_profile.model_nbytes(getattr(reader, "recognizer", None))
+        return reader, nbytes
+
+    def resident_bytes(self):
+        return self._cache.resident_bytes()
+
+    def stats(self):
+        return {
+            "readers": ["+".join(k) for k in self._cache.keys()],
+            **self._cache.stats(),
+            "load_time": self.load_time,
+        }
+
+
+_budget_mb = os.getenv("EASYOCR_READER_BUDGET_MB")
+reader_pool = ReaderPool(
+    max_readers=int(os.getenv("EASYOCR_MAX_READERS", "4")),
+    max_bytes=int(_budget_mb) * 1024 * 1024 if _budget_mb else None,
+)
+
+
+metrics.register_source("easyocr_readers", reader_pool.stats)
+
+
+def to_gray(crop):
+    """
+    Grayscale an RGB crop for EasyOCR, which reads 3-channel arrays as BGR
+    and would otherwise swap the red and blue weights.
+    """
+    return cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+
+
+def get_reader(langs):
+    """Return a shared easyocr.Reader for the given language list."""
+    return reader_pool.get(langs)
+
+
+# Crops per EasyOCR recognizer forward pass in easyocr_recognize_batch
+EASYOCR_BATCH_SIZE = int(os.getenv("EASYOCR_BATCH_SIZE", "16"))
+
+
+def easyocr_recognize_batch(reader, crops, batch_size=EASYOCR_BATCH_SIZE):
+    """
+    Recognize many single-line crops, possibly from different images, with
+    batched recognizer forward passes (EasyOCR's own batching only spans
+    boxes of one image). Crops are bucketed by aspect ratio to limit padding.
+    Returns one (text, confidence) tuple per crop, in input order.
+    """
+    model_height = easyocr_config.imgH
+    ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+
+    items = []
+    for i, crop in enumerate(crops):
+        if crop is None or crop.size == 0:
             continue
+        gray = to_gray(crop)
+        height, width = gray.shape
+        resized, ratio = compute_ratio_and_resize(gray, width, height, model_height)
+        items.append((ratio, i, resized))
+    items.sort(key=lambda item: item[0])
 
-    return best_lang
+    results = [("", 0.0)] * len(crops)
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        max_width = int(np.ceil(chunk[-1][0])) * model_height
+        recognized = get_text(
+            reader.character, model_height, max_width, reader.recognizer, reader.converter,
+            [(i, img) for _, i, img in chunk], ignore_char, "greedy", 5, batch_size,
+            0.1, 0.5, 0.003, 0, reader.device,
+        )
+        for i, text, confidence in recognized:
+            results[i] = (text, float(confidence))
+    return results
 
 
-def detect_text_type_auto(crop_paths):
+@metrics.stage("easyocr")
+def recognize_printed(langs, crops):
     """
-    Classifies text crops as 'printed' or 'handwritten' using three image-based features:
-    average edge strength, Laplacian variance, and gradient magnitude energy
+    easyocr_recognize_batch with the reader for langs, pooled with concurrent
+    requests for the same language set when micro-batching is enabled.
     """
-    total_handwritten_score = 0
-    total_printed_score = 0
-    for p in crop_paths:
-        img = cv2.imread(p, cv2.IMREAD_GRAYSCALE)
-        if img is None:
+    key = reader_pool.make_key(langs)
+    return scheduler.submit(
+        ("easyocr",) + key,
+        lambda items: easyocr_recognize_batch(get_reader(key), items),
+        crops,
+    )
+
+
+# EasyOCR shares one recognition model between all languages of a script, so
+# candidates are scored per script rather than per language
+_SCRIPT_LANG_LISTS = {
+    "bengali": easyocr_config.bengali_lang_list,
+    "arabic": easyocr_config.arabic_lang_list,
+    "devanagari": easyocr_config.devanagari_lang_list,
+    "cyrillic": easyocr_config.cyrillic_lang_list,
+}
+_STANDALONE_SCRIPTS = {"th", "ch_tra", "ch_sim", "ja", "ko", "ta", "te", "kn"}
+
+# langdetect codes that differ from EasyOCR codes
+_LANGDETECT_TO_EASYOCR = {"zh-cn": "ch_sim", "zh-tw": "ch_tra"}
+
+# Number of crops recognized per script when detecting the image language
+LANG_DETECT_SAMPLES = int(os.getenv("LANG_DETECT_SAMPLES", "3"))
+
+
+def script_of(lang):
+    """Return the EasyOCR script family used to recognize a language."""
+    for script, langs in _SCRIPT_LANG_LISTS.items():
+        if lang in langs:
+            return script
+    if lang in _STANDALONE_SCRIPTS:
+        return lang
+    return "latin"
+
+
+def _script_groups(candidates=None):
+    groups = {}
+    for lang in candidates or EASYOCR_SUPPORTED_LANGS:
+        groups.setdefault(script_of(lang), []).append(lang)
+    return groups
+
+
+def preload_readers(candidates=None):
+    """
+    Load the readers used by automatic language detection, one per script
+    group; they also serve printed extraction for ["en", lang].
+    """
+    for langs in _script_groups(candidates).values():
+        get_reader(["en"] + langs)
+
+
+@metrics.stage("language_detection")
+def detect_img_language_auto(crops, candidates=None, samples=LANG_DETECT_SAMPLES):
+    """
+    Determine the language of the text in crops in a single pass.
+    Candidates are grouped by script and each script's recognizer scores the
+    same few largest crops, so the cost depends on the number of scripts, not
+    the number of languages. The language inside the winning script is then
+    chosen from the recognized text.
+    """
+    candidates = candidates or EASYOCR_SUPPORTED_LANGS
+    groups = _script_groups(candidates)
+
+    # Larger crops carry more characters and give steadier confidences
+    sample = sorted(
+        (c for c in crops if c is not None and c.size > 0),
+        key=lambda c: c.shape[0] * c.shape[1],
+        reverse=True,
+    )[:samples]
+    if not sample:
+        return "en"
+
+    best_group, best_score, best_text = ["en"], -1, ""
+    for langs in groups.values():
+        try:
+            # Same key as the extraction reader for ["en", lang], so the pool reuses it
+            reader = get_reader(["en"] + langs)
+            results = [r for crop in sample for r in reader.recognize(to_gray(crop), detail=1)]
+        except Exception:
+            continue
+        if not results:
             continue
 
-        # Feature 1: Average edge strength via Sobel
-        # Printed: sharp, uniform edges; Handwritten: softer, irregular edges
-        blur = cv2.GaussianBlur(img, (3, 3), 0)
-        sobel_x = cv2.Sobel(blur, cv2.CV_64F, 1, 0, ksize=3)
-        sobel_y = cv2.Sobel(blur, cv2.CV_64F, 0, 1, ksize=3)
-        sobel_mag = np.sqrt(sobel_x**2 + sobel_y**2)
-        edge_mean = np.mean(sobel_mag)
-
-        # Feature 2: Laplacian variance (stroke irregularity)
-        # Printed: high contrast boundaries; Handwritten: smooth transitions
-        lap = cv2.Laplacian(img, cv2.CV_64F)
-        lap_var = lap.var()
-
-        # Feature 3: Gradient magnitude energy
-        # Printed: steep intensity changes at boundaries; Handwritten: gradual strokes
-        gx = cv2.Sobel(img, cv2.CV_32F, 1, 0)
-        gy = cv2.Sobel(img, cv2.CV_32F, 0, 1)
-        mag = cv2.magnitude(gx, gy)
-        grad_energy = np.mean(mag)
- 
-        # Score based on empirical thresholds
-        handwritten_score = 0
-        printed_score = 0
-
-        if edge_mean > 108:
-            printed_score += 1
-        else:
-            handwritten_score += 1
+        score = float(np.mean([conf for _, _, conf in results]))
+        if score > best_score:
+            best_score = score
+            best_group = langs
+            best_text = " ".join(text for _, text, _ in results)
 
-        if lap_var > 1800:
-            printed_score += 1
-        else:
-            handwritten_score += 1
+    allowed = set(best_group) | ({"en"} & set(candidates))
+    detected = detect_text_language_auto(best_text, default="")
+    detected = _LANGDETECT_TO_EASYOCR.get(detected, detected)
+    if detected in allowed:
+        return detected
+    return best_group[0]
 
-        if grad_energy > 165:
-            printed_score += 1
-        else:
-            handwritten_score += 1
-        
-        if printed_score > handwritten_score:
-            total_printed_score += 1  
+
+# Upper bound on crops classified per page; larger pages are sampled evenly
+TEXT_TYPE_MAX_SAMPLES = int(os.getenv("TEXT_TYPE_MAX_SAMPLES", "64"))
+
+
+def _gradient_magnitude(img, dtype=np.float32):
+    """
+    Sobel (ksize=3) gradient magnitude computed in a single pass. The int16
+    derivatives are exact, so the result equals cv2.Sobel + magnitude in dtype.
+    """
+    dx, dy = cv2.spatialGradient(img)
+    return cv2.magnitude(dx.astype(dtype), dy.astype(dtype))
+
+
+def is_printed_crop(crop):
+    """
+    Votes 'printed' (True) or 'handwritten' (False) for a single crop using three
+    image-based features: average edge strength, Laplacian variance, and
+    gradient magnitude energy.
+    """
+    img = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+
+    # Feature 1: Average edge strength via Sobel
+    # Printed: sharp, uniform edges; Handwritten: softer, irregular edges
+    blur = cv2.GaussianBlur(img, (3, 3), 0)
+    # float64, as the original np.sqrt over CV_64F Sobel output
+    edge_mean = _gradient_magnitude(blur, np.float64).mean()
+
+    # Feature 2: Laplacian variance (stroke irregularity)
+    # Printed: high contrast boundaries; Handwritten: smooth transitions
+    # Integer-valued, so float32 is exact; accumulate the variance in float64
+    lap_var = cv2.Laplacian(img, cv2.CV_32F).var(dtype=np.float64)
+
+    # Feature 3: Gradient magnitude energy
+    # Printed: steep intensity changes at boundaries; Handwritten: gradual strokes
+    # float32 with numpy's float32 mean, as the original CV_32F version
+    grad_energy = _gradient_magnitude(img).mean()
+
+    # Score based on empirical thresholds
+    printed_score = (edge_mean > 108) + (lap_var > 1800) + (grad_energy > 165)
+    return printed_score >= 2
+
+
+@metrics.stage("text_type")
+def detect_text_type_auto(crops, max_samples=TEXT_TYPE_MAX_SAMPLES):
+    """
+    Classifies text crops as 'printed' or 'handwritten' by majority vote over
+    per-crop decisions (ties go to 'printed'). Stops as soon as the remaining
+    crops can no longer change the outcome.
+    """
+    crops = [c for c in crops if c is not None and c.size > 0]
+    if max_samples and len(crops) > max_samples:
+        # Spread the sample across the whole page rather than its top
+        idx = np.linspace(0, len(crops) - 1, max_samples).round().astype(int)
+        crops = [crops[i] for i in idx]
+
+    total_printed_score = 0
+    total_handwritten_score = 0
+    remaining = len(crops)
+    for crop in crops:
+        remaining -= 1
+        if is_printed_crop(crop):
+            total_printed_score += 1
         else:
             total_handwritten_score += 1
 
+        if total_printed_score >= total_handwritten_score + remaining:
+            break
+        if total_handwritten_score > total_printed_score + remaining:
+            break
+
     return "printed" if total_printed_score >= total_handwritten_score else "handwritten"
@@ -0,0 +1,196 @@
+import time
+import uuid
+import threading
+from collections import deque
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """State of one queued extraction, shared between the worker and HTTP threads."""
+
+    def __init__(self, params, owner=None):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.owner = owner
+        self.status = "queued"
+        self.lines = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout."""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.finished, timeout)
+
+    def add_line(self, line):
+        with self.changed:
+            self.lines.append(line)
+            self.changed.notify_all()
+
+    def _start(self):
+        """Move a queued job to running; False if it was cancelled meanwhile."""
+        with self.changed:
+            if self.status != "queued" or self.cancel_requested.is_set():
+                return False
+            self.status = "running"
+            self.changed.notify_all()
+            return True
+
+    def _set_status(self, status, result=None, error=None):
+        with self.changed:
+            if self.finished:
+                # A cancelled job keeps its final state
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+            if self.finished:
+                self.finished_at = time.time()
+            self.changed.notify_all()
+
+    def to_dict(self, include_lines=True):
+        with self.changed:
+            data = {
+                "job_id": self.id,
+                "status": self.status,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+            if include_lines:
+                data["lines"] = list(self.lines)
+            if self.result is not None:
+                data["result"] = self.result
+            if self.error is not None:
+                data["error"] = self.error
+            return data
+
+    def iter_events(self, heartbeat=15):
+        """
+        Yield line events as they are recognized, then a final status event.
+        A heartbeat event is yielded when nothing happened for heartbeat seconds.
+        """
+        sent = 0
+        while True:
+            idle = False
+            with self.changed:
+                if len(self.lines) == sent and not self.finished:
+                    idle = not self.changed.wait(timeout=heartbeat)
+                new_lines = self.lines[sent:]
+                finished = self.finished
+            for line in new_lines:
+                yield {"event": "line", **line}
+            sent += len(new_lines)
+            if finished:
+                yield {"event": "status", **self.to_dict(include_lines=False)}
+                return
+            if idle:
+                yield {"event": "heartbeat", "status": self.status}
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue served by dedicated inference worker threads,
+    separate from the HTTP threads. handler(job) runs one job and returns its
+    result; it should call job.add_line for streamed lines and poll
+    job.cancel_requested.
+    """
+
+    def __init__(self, handler, workers=1, max_queued=16, retention=3600):
+        self.handler = handler
+        self.retention = retention
+        self.max_queued = max_queued
+        self._pending = deque()  # live queued jobs; cancelled ones are removed
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._workers = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._work, name=f"extract-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+        threading.Thread(target=self._prune_loop, name="extract-job-pruner", daemon=True).start()
+
+    def submit(self, params, owner=None):
+        """Queue a job; raises QueueFull instead of blocking when at capacity."""
+        self._prune()
+        job = Job(params, owner)
+        with self._lock:
+            if len(self._pending) >= self.max_queued:
+                raise QueueFull()
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._available.notify()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        # Checked and changed under the job's lock so a worker cannot start
+        # it in between; queued jobs leave the queue and free their slot
+        with job.changed:
+            if not job.finished:
+                job.cancel_requested.set()
+                if job.status == "queued":
+                    job._set_status("cancelled")
+                    with self._lock:
+                        if job in self._pending:
+                            self._pending.remove(job)
+                    job.params = None
+        return job
+
+    def depth(self):
+        """Number of live jobs waiting for a worker."""
+        with self._lock:
+            return len(self._pending)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]
+            for jid in expired:
+                del self._jobs[jid]
+
+    def _prune_loop(self):
+        # Finished jobs expire even when no new jobs are submitted
+        while True:
+            time.sleep(max(1, min(self.retention, 60)))
+            self._prune()
+
+    def _work(self):
+        while True:
+            with self._available:
+                while not self._pending:
+                    self._available.wait()
+                job = self._pending.popleft()
+            try:
+                if not job._start():
+                    continue
+                try:
+                    result = self.handler(job)
+                except Exception as e:
+                    if job.cancel_requested.is_set():
+                        job._set_status("cancelled")
+                    else:
+                        job._set_status("failed", error=str(e))
+                else:
+                    job._set_status("done", result=result)
+            finally:
+                # Drop the upload as soon as the job is over; only the result is retained
+                job.params = None
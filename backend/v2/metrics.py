@@ -0,0 +1,98 @@
+import threading
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+# Buckets from a few milliseconds (decode, DB write) up to whole-page recognition
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status",
+    ["endpoint", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint",
+    ["endpoint"], buckets=STAGE_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds", "Time spent in each extraction/translation stage",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+MODEL_LOADS = Counter("model_loads_total", "Models loaded into memory", ["model"])
+MODEL_LOAD_LATENCY = Histogram(
+    "model_load_duration_seconds", "Time to load a model", ["model"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+def stage(name):
+    """Time a pipeline stage; usable as a context manager or a decorator."""
+    return STAGE_LATENCY.labels(stage=name).time()
+
+
+def observe_stage(name, seconds):
+    STAGE_LATENCY.labels(stage=name).observe(seconds)
+
+
+def record_model_load(model, seconds):
+    MODEL_LOADS.labels(model=model).inc()
+    MODEL_LOAD_LATENCY.labels(model=model).observe(seconds)
+
+
+class StatsCollector:
+    """
+    Exposes the stats() dicts of caches, pools and queues as gauges, read at
+    scrape time. Numbers become <source>_<field>; dicts of numbers (or of
+    dicts of numbers) get a "key" label. Other values are skipped.
+    """
+
+    def __init__(self):
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def register(self, source, stats):
+        with self._lock:
+            self._sources[source] = stats
+
+    def collect(self):
+        with self._lock:
+            sources = list(self._sources.items())
+        for source, stats in sources:
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Metrics source {source} failed: {e}")
+                continue
+            families = {}
+
+            def gauge(name, doc, labels=()):
+                if name not in families:
+                    families[name] = GaugeMetricFamily(name, doc, labels=list(labels))
+                return families[name]
+
+            for field, value in values.items():
+                name = f"{source}_{field}"
+                if _is_number(value):
+                    gauge(name, f"{source} {field}").add_metric([], value)
+                elif isinstance(value, dict):
+                    for key, item in value.items():
+                        if _is_number(item):
+                            gauge(name, f"{source} {field} by key", ["key"]).add_metric([str(key)], item)
+                        elif isinstance(item, dict):
+                            for sub, number in item.items():
+                                if _is_number(number):
+                                    gauge(f"{source}_{sub}", f"{source} {sub} by key", ["key"]) \
+                                        .add_metric([str(key)], number)
+            yield from families.values()
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_source(source, stats):
+    """Publish stats() (a dict of numbers) as gauges prefixed with source."""
+    stats_collector.register(source, stats)
@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ModelNotFound(OSError):
+    """No model is published for the requested key."""
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache of loaded models, shared by the EasyOCR reader pool
+    and the MarianMT manager. Concurrent misses for a key load it only once.
+    Entries are evicted in LRU order once there are more than max_entries or
+    their total size exceeds max_bytes; the newest entry is always kept.
+    ModelNotFound raised by a loader is remembered for negative_ttl seconds.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, negative_ttl=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (model, nbytes)
+        self._missing = {}  # key -> (time the lookup failed, message)
+        self._loading = {}  # key -> Event
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, load):
+        """Return the model cached under key, calling load() -> (model, nbytes) on a miss."""
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                missing = self._missing.get(key)
+                if missing is not None and time.time() - missing[0] < self.negative_ttl:
+                    raise ModelNotFound(missing[1])
+                pending = self._loading.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading the same model: wait for it and retry
+            pending.wait()
+
+        try:
+            try:
+                model, nbytes = load()
+            except ModelNotFound as e:
+                with self._lock:
+                    self._missing[key] = (time.time(), str(e))
+                raise
+            with self._lock:
+                self._missing.pop(key, None)
+                self._entries[key] = (model, nbytes)
+                self._evict()
+            return model
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def _evict(self):
+        # Caller holds the lock; never evict the most recently inserted model
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self.resident_bytes() > self.max_bytes)
+        ):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resident_bytes(self):
+        return sum(nbytes for _, nbytes in self._entries.values())
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def missing_keys(self):
+        with self._lock:
+            return list(self._missing)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "resident_bytes": self.resident_bytes(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,159 @@
+import os
+import re
+import threading
+import cpu_profile
+
+# "torch" runs every model in eager PyTorch; "onnx" runs CRAFT, TrOCR and
+# MarianMT through ONNX Runtime, exporting each model on first use
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "torch")
+if INFERENCE_ENGINE not in ("torch", "onnx"):
+    raise ValueError(f"INFERENCE_ENGINE must be 'torch' or 'onnx', not {INFERENCE_ENGINE!r}")
+USE_ONNX = INFERENCE_ENGINE == "onnx"
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+ONNX_OPSET = int(os.getenv("ONNX_OPSET", "14"))
+
+_export_lock = threading.Lock()
+_sessions = {}
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError("The ONNX engine requires onnxruntime (pip install onnxruntime)")
+    return onnxruntime
+
+
+def _require_optimum():
+    try:
+        from optimum import onnxruntime as ort_models
+    except ImportError:
+        raise RuntimeError("The ONNX engine requires optimum (pip install optimum[onnxruntime])")
+    return ort_models
+
+
+def model_dir(name):
+    """Local directory holding the ONNX export of a model."""
+    return os.path.join(ONNX_MODEL_DIR, re.sub(r"[^\w.-]", "_", name))
+
+
+def session_options():
+    # Same thread budget as the PyTorch engine, see cpu_profile
+    ort = _require_onnxruntime()
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = cpu_profile.TORCH_NUM_THREADS
+    options.inter_op_num_threads = cpu_profile.TORCH_INTEROP_THREADS
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def get_session(path):
+    """Return a shared InferenceSession for an .onnx file (run() is thread-safe)."""
+    with _export_lock:
+        if path not in _sessions:
+            ort = _require_onnxruntime()
+            _sessions[path] = ort.InferenceSession(
+                path, session_options(), providers=["CPUExecutionProvider"]
+            )
+        return _sessions[path]
+
+
+class OnnxModule:
+    """
+    Callable stand-in for a torch module backed by ONNX Runtime: takes and
+    returns torch tensors, so code written for the eager module keeps working.
+    """
+
+    def __init__(self, path):
+        self.session = get_session(path)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, *inputs):
+        import torch
+        feeds = {name: t.detach().cpu().numpy() for name, t in zip(self.input_names, inputs)}
+        outputs = [torch.from_numpy(o) for o in self.session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+# ----- CRAFT -----
+
+CRAFT_DIR = model_dir("craft")
+
+
+def export_craft(craft, out_dir=CRAFT_DIR, force=False):
+    """
+    Export a craft_text_detector.Craft's networks with dynamic image size.
+    Returns (craftnet_path, refinenet_path); refinenet_path is None when the
+    detector has no refiner.
+    """
+    import torch
+    craft_path = os.path.join(out_dir, "craftnet.onnx")
+    refine_path = os.path.join(out_dir, "refinenet.onnx") if craft.refine_net is not None else None
+    with _export_lock:
+        if force or not os.path.exists(craft_path) or (refine_path and not os.path.exists(refine_path)):
+            os.makedirs(out_dir, exist_ok=True)
+            x = torch.randn(1, 3, 640, 640)
+            with torch.no_grad():
+                y, feature = craft.craft_net(x)
+                torch.onnx.export(
+                    craft.craft_net, (x,), craft_path, opset_version=ONNX_OPSET,
+                    input_names=["image"], output_names=["y", "feature"],
+                    dynamic_axes={
+                        "image": {0: "batch", 2: "height", 3: "width"},
+                        "y": {0: "batch", 1: "map_height", 2: "map_width"},
+                        "feature": {0: "batch", 2: "map_height", 3: "map_width"},
+                    },
+                )
+                if refine_path:
+                    torch.onnx.export(
+                        craft.refine_net, (y, feature), refine_path, opset_version=ONNX_OPSET,
+                        input_names=["y", "feature"], output_names=["y_refined"],
+                        dynamic_axes={
+                            "y": {0: "batch", 1: "map_height", 2: "map_width"},
+                            "feature": {0: "batch", 2: "map_height", 3: "map_width"},
+                            "y_refined": {0: "batch", 1: "map_height", 2: "map_width"},
+                        },
+                    )
+    return craft_path, refine_path
+
+
+def use_onnx_craft(craft):
+    """Swap a Craft's torch networks for ONNX Runtime sessions, exporting if needed."""
+    craft_path, refine_path = export_craft(craft)
+    craft.craft_net = OnnxModule(craft_path)
+    craft.refine_net = OnnxModule(refine_path) if refine_path else None
+    return craft
+
+
+# ----- TrOCR and MarianMT -----
+
+_SEQ2SEQ_CLASSES = {
+    "vision2seq": "ORTModelForVision2Seq",  # TrOCR
+    "seq2seq": "ORTModelForSeq2SeqLM",  # MarianMT
+}
+
+
+def export_seq2seq(name, kind, force=False):
+    """
+    Export a Hugging Face encoder-decoder model with optimum. The decoder is
+    exported with past key/value inputs and outputs, so generation feeds the
+    KV cache back instead of re-running the whole prefix at every step.
+    """
+    ort_models = _require_optimum()
+    out_dir = model_dir(name)
+    with _export_lock:
+        if force or not os.path.exists(os.path.join(out_dir, "config.json")):
+            model_class = getattr(ort_models, _SEQ2SEQ_CLASSES[kind])
+            model = model_class.from_pretrained(name, export=True, use_cache=True)
+            model.save_pretrained(out_dir)
+    return out_dir
+
+
+def load_seq2seq(name, kind):
+    """Load the ONNX Runtime version of a model, exporting it on first use."""
+    ort_models = _require_optimum()
+    out_dir = export_seq2seq(name, kind)
+    model_class = getattr(ort_models, _SEQ2SEQ_CLASSES[kind])
+    return model_class.from_pretrained(
+        out_dir, use_cache=True, provider="CPUExecutionProvider", session_options=session_options()
+    )
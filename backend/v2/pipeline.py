@@ -0,0 +1,304 @@
+import io
+import os
+import cv2
+import shutil
+import tempfile
+import numpy as np
+import easyocr
+import craft_text_detector
+from PIL import Image
+from contextlib import contextmanager
+from detect_and_crop import detect_and_crop
+from extract_util import detect_img_language_auto, detect_text_type_auto, get_reader
+from extract_util import recognize_handwritten, recognize_printed, to_gray
+from extract_util import TROCR_MODEL_NAME, EASYOCR_SUPPORTED_LANGS
+from result_cache import ResultCache
+from cpu_profile import QUANTIZE_MODELS
+from onnx_engine import INFERENCE_ENGINE
+from batching import scheduler
+import metrics
+
+# When set, uploads and crops are written here for inspection; otherwise the
+# whole extract path stays in memory.
+DEBUG_DIR = os.getenv("OCR_DEBUG_DIR") or None
+DEBUG_KEEP = os.getenv("OCR_DEBUG_KEEP", "1") == "1"
+
+# Identifies the models behind an extraction result; cached results from any
+# other version are never returned. Override to force invalidation.
+MODEL_VERSION = os.getenv("EXTRACT_MODEL_VERSION") or "|".join([
+    TROCR_MODEL_NAME + ("-int8" if QUANTIZE_MODELS else ""),
+    f"engine-{INFERENCE_ENGINE}",
+    # Micro-batching recognizes printed lines whole instead of with readtext
+    "printed-" + ("recognize" if scheduler.enabled else "readtext"),
+    f"easyocr-{easyocr.__version__}",
+    f"craft-{craft_text_detector.__version__}",
+    "langs-" + ",".join(EASYOCR_SUPPORTED_LANGS),
+])
+
+result_cache = ResultCache(
+    MODEL_VERSION,
+    max_entries=int(os.getenv("EXTRACT_CACHE_SIZE", "256")),
+    db_path=os.getenv("EXTRACT_CACHE_DB") or None,
+)
+metrics.register_source("extract_cache", result_cache.stats)
+
+
+@contextmanager
+def request_workspace(root=DEBUG_DIR, keep=DEBUG_KEEP):
+    """
+    Yield an isolated scratch directory for one request, or None when the
+    request runs fully in memory. Each request gets its own unique directory,
+    so concurrent requests never see or delete each other's files.
+    """
+    if not root:
+        yield None
+        return
+
+    os.makedirs(root, exist_ok=True)
+    path = tempfile.mkdtemp(prefix="extract_", dir=root)
+    try:
+        yield path
+    finally:
+        if not keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@metrics.stage("decode")
+def decode_image(image_bytes):
+    """Decode uploaded image bytes into an RGB numpy array."""
+    arr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if arr is not None:
+        return cv2.cvtColor(arr, cv2.COLOR_BGR2RGB)
+
+    # Formats OpenCV cannot decode (e.g. GIF) fall back to PIL
+    try:
+        return np.array(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+    except Exception:
+        raise ValueError("Unsupported or corrupt image")
+
+
+class ExtractionCancelled(Exception):
+    pass
+
+
+class LineEmitter:
+    """
+    Hands recognized lines to on_line(line) in reading order, even when they
+    are recognized out of order, and aborts once should_cancel() is true.
+    """
+
+    def __init__(self, on_line=None, should_cancel=None):
+        self.on_line = on_line
+        self.should_cancel = should_cancel
+        self._pending = {}
+        self._next = 0
+
+    def check(self):
+        if self.should_cancel is not None and self.should_cancel():
+            raise ExtractionCancelled()
+
+    def add(self, line):
+        if self.on_line is None:
+            return
+        self._pending[line["index"]] = line
+        while self._next in self._pending:
+            self.on_line(self._pending.pop(self._next))
+            self._next += 1
+
+
+def run_extraction(image, input_language="auto", text_type="auto", debug_dir=None,
+                   on_line=None, should_cancel=None):
+    """
+    Detect, classify and recognize text in an RGB image array.
+    Returns a dict with extracted_text, text_type, detected_language, the
+    number of detected text regions and the per-line results (text, crop box
+    and confidence). Intermediate images are only written when a debug_dir
+    (see request_workspace) is given.
+    on_line(line) receives every line in reading order as soon as it is
+    recognized; should_cancel() is polled between stages and batches and
+    aborts the run with ExtractionCancelled.
+    """
+    emitter = LineEmitter(on_line, should_cancel)
+
+    # Detect + Crop
+    crops, boxes = detect_and_crop(image, debug_dir=debug_dir, return_boxes=True)
+    emitter.check()
+    if not crops:
+        return {
+            "extracted_text": "",
+            "text_type": text_type,
+            "detected_language": input_language,
+            "regions": 0,
+            "lines": []
+        }
+
+    if input_language == "auto":
+        input_language = detect_img_language_auto(crops)
+    if text_type == "auto":
+        text_type = detect_text_type_auto(crops)
+    emitter.check()
+
+    lines = [None] * len(crops)
+
+    def record(i, text, confidence):
+        lines[i] = {"index": i, "text": text, "box": boxes[i], "confidence": float(confidence)}
+        emitter.add(lines[i])
+
+    # Run OCR based on text type
+    if text_type == 'handwritten':
+        def on_batch(indices, texts, confidences):
+            for i, text, confidence in zip(indices, texts, confidences):
+                record(i, text, confidence)
+            emitter.check()
+
+        # When streaming, decode in reading order and return the first line
+        # after a single-line batch to minimize time-to-first-line
+        streaming = on_line is not None
+        recognize_handwritten(crops, on_batch=on_batch, ordered=streaming, first_batch=1 if streaming else None)
+    elif scheduler.enabled:
+        # Recognize whole lines together with concurrent requests' lines
+        recognized = recognize_printed(["en", input_language], crops)
+        for i, (text, confidence) in enumerate(recognized):
+            record(i, text, confidence)
+    else:
+        reader = get_reader(["en", input_language])
+        # Timed per page, like the trocr stage and recognize_printed
+        with metrics.stage("easyocr"):
+            for i, crop in enumerate(crops):
+                emitter.check()
+                results = reader.readtext(to_gray(crop), detail=1)
+                confidence = np.mean([conf for _, _, conf in results]) if results else 0.0
+                record(i, " ".join(text for _, text, _ in results), confidence)
+
+    return {
+        "extracted_text": "\n".join(line["text"] for line in lines),
+        "text_type": text_type,
+        "detected_language": input_language,
+        "regions": len(crops),
+        "lines": lines
+    }
+
+
+# Resolution used to rasterize PDF pages, and cap on pages per batch request
+PDF_DPI = int(os.getenv("PDF_DPI", "200"))
+BATCH_MAX_PAGES = int(os.getenv("BATCH_MAX_PAGES", "50"))
+
+
+def rasterize_pdf(pdf_bytes, dpi=PDF_DPI, max_pages=BATCH_MAX_PAGES, page_numbers=None):
+    """
+    Render the pages of a PDF into RGB numpy arrays: the first max_pages, or
+    only the given 0-based page_numbers.
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise ValueError("PDF support requires PyMuPDF (pip install pymupdf)")
+
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    except Exception:
+        raise ValueError("Unsupported or corrupt PDF")
+
+    pages = []
+    with doc:
+        if page_numbers is None:
+            page_numbers = range(min(doc.page_count, max_pages))
+        for number in page_numbers:
+            page = doc.load_page(number)
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            pages.append(arr[:, :, :3].copy())
+    return pages
+
+
+def pdf_page_count(pdf_bytes):
+    """Number of pages in a PDF, without rasterizing it (0 if it cannot be read)."""
+    try:
+        import fitz  # PyMuPDF
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+
+def run_batch_extraction(pages, input_language="auto", text_type="auto", should_cancel=None):
+    """
+    Extract text from many page images at once. CRAFT runs per page, then
+    crops from all pages are pooled: handwritten crops go through TrOCR and
+    printed crops through EasyOCR (per language) in cross-page batches.
+    Returns one result dict per page, in input order. A page that fails gets
+    an "error" message instead of failing the whole batch; should_cancel()
+    is polled between pages and aborts with ExtractionCancelled.
+    """
+    emitter = LineEmitter(should_cancel=should_cancel)
+    results = []
+    handwritten = []  # (page index, line index, crop)
+    printed = {}  # language -> [(page index, line index, crop)]
+
+    def fail(p, error):
+        results[p].update(error=str(error), regions=0, lines=[])
+
+    for p, image in enumerate(pages):
+        emitter.check()
+        results.append({
+            "text_type": text_type,
+            "detected_language": input_language,
+            "regions": 0,
+            "lines": [],
+        })
+        try:
+            crops, boxes = detect_and_crop(image, return_boxes=True)
+            page_language = input_language
+            page_type = text_type
+            if crops:
+                if page_language == "auto":
+                    page_language = detect_img_language_auto(crops)
+                if page_type == "auto":
+                    page_type = detect_text_type_auto(crops)
+        except Exception as e:
+            print(f"Batch page {p} failed: {e}")
+            fail(p, e)
+            continue
+
+        results[p].update(
+            text_type=page_type,
+            detected_language=page_language,
+            regions=len(crops),
+            lines=[{"index": i, "text": "", "box": box, "confidence": 0.0} for i, box in enumerate(boxes)],
+        )
+        for i, crop in enumerate(crops):
+            if page_type == "handwritten":
+                handwritten.append((p, i, crop))
+            else:
+                printed.setdefault(page_language, []).append((p, i, crop))
+
+    if handwritten:
+        emitter.check()
+
+        def on_batch(indices, texts, confidences):
+            for k, text, confidence in zip(indices, texts, confidences):
+                p, i, _ = handwritten[k]
+                results[p]["lines"][i].update(text=text, confidence=float(confidence))
+
+        try:
+            recognize_handwritten([crop for _, _, crop in handwritten], on_batch=on_batch)
+        except Exception as e:
+            print(f"Batch handwriting recognition failed: {e}")
+            for p in {p for p, _, _ in handwritten}:
+                fail(p, e)
+
+    for language, items in printed.items():
+        emitter.check()
+        try:
+            recognized = recognize_printed(["en", language], [crop for _, _, crop in items])
+        except Exception as e:
+            print(f"Batch printed recognition ({language}) failed: {e}")
+            for p in {p for p, _, _ in items}:
+                fail(p, e)
+            continue
+        for (p, i, _), (text, confidence) in zip(items, recognized):
+            results[p]["lines"][i].update(text=text, confidence=confidence)
+
+    for result in results:
+        result["extracted_text"] = "\n".join(line["text"] for line in result["lines"])
+    return results
@@ -0,0 +1,108 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Content-addressed cache for extraction results.
+    Results are keyed by a hash of the image bytes, the request options and the
+    model version. A bounded in-process LRU tier sits in front of an optional
+    SQLite tier that survives restarts.
+    """
+
+    def __init__(self, model_version, max_entries=256, db_path=None):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS extract_cache (
+                    key TEXT PRIMARY KEY,
+                    model_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            # Results produced by other model versions can never be hit again
+            self._db.execute("DELETE FROM extract_cache WHERE model_version != ?", (model_version,))
+            self._db.commit()
+
+    def make_key(self, image_bytes, input_language, text_type):
+        h = hashlib.sha256(image_bytes)
+        h.update(f"|{input_language}|{text_type}|{self.model_version}".encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return dict(self._memory[key])
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM extract_cache WHERE key = ? AND model_version = ?",
+                    (key, self.model_version)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.disk_hits += 1
+                    return dict(result)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        with self._lock:
+            self._remember(key, dict(result))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO extract_cache (key, model_version, result, created_at) VALUES (?, ?, ?, ?)",
+                    (key, self.model_version, json.dumps(result), time.time())
+                )
+                self._db.commit()
+
+    def _remember(self, key, result):
+        # Caller holds the lock
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, model_version=None):
+        """
+        Drop every cached result, e.g. after a model was replaced. When a new
+        model_version is given, later keys are derived from it.
+        """
+        with self._lock:
+            if model_version is not None:
+                self.model_version = model_version
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM extract_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+            }
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import unicodedata
+
+
+def normalize_segment(text):
+    """Normalize a sentence for lookup: NFC, collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TranslationMemory:
+    """
+    Persistent sentence-level translation memory stored in SQLite.
+    Entries are keyed by (source language, target language, normalized
+    sentence) and tagged with the model version that produced them; entries
+    of other versions are dropped on startup. The least recently used ones
+    are pruned once the store holds more than max_entries. A model_version
+    of None opens the store for inspection only, keeping every entry.
+    """
+
+    # Segments per IN (...) lookup query, below SQLite's bound parameter limit
+    LOOKUP_CHUNK = 500
+    # Fraction of max_entries freed by each prune
+    PRUNE_SLACK = 0.1
+
+    def __init__(self, db_path, model_version=None, max_entries=100000):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                src_lang TEXT NOT NULL,
+                tgt_lang TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL,
+                model_version TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (src_lang, tgt_lang, source)
+            )
+        """)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(translation_memory)")]
+        if "model_version" not in columns:
+            # Stores created before entries were versioned
+            self._db.execute("ALTER TABLE translation_memory ADD COLUMN model_version TEXT NOT NULL DEFAULT ''")
+        if model_version is not None:
+            # Translations produced by other model versions can never be hit again
+            self._db.execute("DELETE FROM translation_memory WHERE model_version != ?", (model_version,))
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_tm_last_used ON translation_memory (last_used)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+        self.lookups = 0
+        self.hits = 0
+        self.bytes_saved = 0
+
+    def lookup(self, segments, src_lang, tgt_lang):
+        """Return a list aligned with segments holding the cached translation or None."""
+        now = time.time()
+        sources = [normalize_segment(segment) for segment in segments]
+        unique = list(dict.fromkeys(sources))
+        targets = {}
+        with self._lock:
+            # One IN (...) query per chunk instead of a SELECT per segment
+            for i in range(0, len(unique), self.LOOKUP_CHUNK):
+                chunk = unique[i:i + self.LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    "SELECT source, target FROM translation_memory WHERE src_lang = ? AND tgt_lang = ? "
+                    f"AND model_version = ? AND source IN ({', '.join('?' * len(chunk))})",
+                    (src_lang, tgt_lang, self.model_version or "", *chunk)
+                ).fetchall()
+                targets.update(rows)
+            if targets:
+                self._db.executemany(
+                    "UPDATE translation_memory SET hits = hits + 1, last_used = ? WHERE src_lang = ? AND tgt_lang = ? AND source = ?",
+                    [(now, src_lang, tgt_lang, source) for source in targets]
+                )
+                self._db.commit()
+            found = [targets.get(source) for source in sources]
+            self.lookups += len(sources)
+            for source, target in zip(sources, found):
+                if target is not None:
+                    self.hits += 1
+                    self.bytes_saved += len(source.encode("utf-8"))
+        return found
+
+    def store(self, segments, translations, src_lang, tgt_lang):
+        now = time.time()
+        version = self.model_version or ""
+        rows = [(src_lang, tgt_lang, normalize_segment(s), t, now, version) for s, t in zip(segments, translations)]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO translation_memory (src_lang, tgt_lang, source, target, hits, last_used, model_version) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                rows
+            )
+            # Upper bound: replaced rows are counted as new until the next prune recounts
+            self._count += len(rows)
+            if self._count > self.max_entries:
+                self._prune()
+            self._db.commit()
+
+    def _prune(self):
+        # Caller holds the lock. Prune down to the low watermark, so the
+        # exact COUNT(*) runs about once per PRUNE_SLACK of max_entries inserts
+        count = self._db.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+        if count > self.max_entries:
+            keep = int(self.max_entries * (1 - self.PRUNE_SLACK))
+            self._db.execute("""
+                DELETE FROM translation_memory WHERE rowid IN (
+                    SELECT rowid FROM translation_memory ORDER BY last_used ASC LIMIT ?
+                )
+            """, (count - keep,))
+            count = keep
+        self._count = count
+
+    def entries(self, limit=100):
+        """Most recently used entries, for inspection."""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT src_lang, tgt_lang, source, target, hits, last_used, model_version
+                FROM translation_memory ORDER BY last_used DESC LIMIT ?
+            """, (limit,)).fetchall()
+        keys = ("src_lang", "tgt_lang", "source", "target", "hits", "last_used", "model_version")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM translation_memory")
+            self._db.commit()
+            self._count = 0
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+            return {
+                "entries": count,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the translation memory.")
+    parser.add_argument("--db", default=os.getenv("TRANSLATION_MEMORY_DB", "translation_memory.db"))
+    parser.add_argument("--limit", type=int, default=20, help="Most recently used entries to print")
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    args = parser.parse_args()
+
+    memory = TranslationMemory(args.db)
+    if args.clear:
+        memory.clear()
+        print(f"Cleared {args.db}")
+        return
+    print(f"{memory.stats()['entries']} entries in {args.db}")
+    for entry in memory.entries(args.limit):
+        print(json.dumps(entry, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,281 @@
-from transformers import MarianMTModel, MarianTokenizer
-from functools import lru_cache
-import torch
+import os
+import re
+import time
+import cpu_profile
+import onnx_engine
+from model_cache import ModelCache, ModelNotFound
+from batching import scheduler
+import metrics
 from langdetect import detect, DetectorFactory, LangDetectException
+from translation_memory import TranslationMemory, normalize_segment
 
 
 class TranslationNotSupported(Exception):
     pass
 
 
-@lru_cache(maxsize=8)
+def _is_missing_repo(error):
+    # transformers wraps the hub's RepositoryNotFoundError in an OSError
+    from huggingface_hub.utils import RepositoryNotFoundError
+    while error is not None:
+        if isinstance(error, RepositoryNotFoundError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class MarianModelManager:
+    """
+    Cache of MarianMT (tokenizer, model) pairs keyed by language pair.
+    Models are evicted in LRU order once their total size exceeds max_bytes.
+    Pairs without a published model are remembered for negative_ttl seconds,
+    so pivot routes through English are taken without another hub lookup;
+    other load errors (network, disk) are raised without being remembered.
+    """
+
+    def __init__(self, max_bytes=None, negative_ttl=3600):
+        self._cache = ModelCache(max_bytes=max_bytes, negative_ttl=negative_ttl)
+        self.load_times = {}
+
+    def get(self, src_lang, tgt_lang):
+        return self._cache.get((src_lang, tgt_lang), lambda: self._load(src_lang, tgt_lang))
+
+    def _load(self, src_lang, tgt_lang):
+        # transformers and torch are imported on first use to keep startup fast
+        from transformers import MarianMTModel, MarianTokenizer
+        t0 = time.time()
+        # Load the MarianMT model for the specified language pair
+        model_name = f"Helsinki-NLP/opus-mt-{src_lang}-{tgt_lang}"
+        try:
+            tokenizer = MarianTokenizer.from_pretrained(model_name)
+            if onnx_engine.USE_ONNX:
+                model = onnx_engine.load_seq2seq(model_name, "seq2seq")
+            else:
+                model = cpu_profile.load_model(model_name, lambda: MarianMTModel.from_pretrained(model_name))
+        except OSError as e:
+            if not _is_missing_repo(e):
+                raise
+            raise ModelNotFound(f"No MarianMT model for {src_lang}-{tgt_lang}") from e
+        elapsed = time.time() - t0
+        metrics.record_model_load(f"marian:{src_lang}-{tgt_lang}", elapsed)
+        self.load_times[f"{src_lang}-{tgt_lang}"] = elapsed
+        return (tokenizer, model), cpu_profile.model_nbytes(model)
+
+    def resident_bytes(self):
+        return self._cache.resident_bytes()
+
+    def preload(self, pairs):
+        """Load the given (src, tgt) pairs, skipping those without a model."""
+        for src_lang, tgt_lang in pairs:
+            try:
+                self.get(src_lang, tgt_lang)
+            except ModelNotFound:
+                print(f"Preload skipped: no MarianMT model for {src_lang}-{tgt_lang}")
+            except OSError as e:
+                print(f"Preload failed for {src_lang}-{tgt_lang}: {e}")
+
+    def stats(self):
+        cache = self._cache.stats()
+        return {
+            "models": [f"{s}-{t}" for s, t in self._cache.keys()],
+            "resident_bytes": cache["resident_bytes"],
+            "missing_pairs": [f"{s}-{t}" for s, t in self._cache.missing_keys()],
+            **{k: v for k, v in cache.items() if k != "resident_bytes"},
+            "load_times": dict(self.load_times),
+        }
+
+
+def parse_pairs(value):
+    """Parse "en-zh,zh-en" into [("en", "zh"), ("zh", "en")]."""
+    return [tuple(p.strip().split("-", 1)) for p in value.split(",") if "-" in p]
+
+
+_budget_mb = os.getenv("MT_MODEL_BUDGET_MB", "2048")
+model_manager = MarianModelManager(
+    max_bytes=int(_budget_mb) * 1024 * 1024 if _budget_mb else None,
+    negative_ttl=int(os.getenv("MT_NEGATIVE_TTL", "3600")),
+)
+PRELOAD_PAIRS = parse_pairs(os.getenv("MT_PRELOAD_PAIRS", ""))
+metrics.register_source("marian_models", model_manager.stats)
+
+
 def load_model(src_lang: str, tgt_lang: str):
-    # Load the MarianMT model for the specified language pair
-    model_name = f"Helsinki-NLP/opus-mt-{src_lang}-{tgt_lang}"
-    tokenizer = MarianTokenizer.from_pretrained(model_name)
-    model = MarianMTModel.from_pretrained(model_name)
-    model.eval()
-    return tokenizer, model
+    return model_manager.get(src_lang, tgt_lang)
 
 
-def translate_text(text: str, src_lang: str, tgt_lang: str):
-    if not text.strip():
-        return ""
-    if src_lang == tgt_lang:
-        return text
+# Segments per generate call, and cap on padded tokens per batch
+TRANSLATE_MAX_BATCH = int(os.getenv("TRANSLATE_MAX_BATCH", "16"))
+TRANSLATE_MAX_BATCH_TOKENS = int(os.getenv("TRANSLATE_MAX_BATCH_TOKENS", "4096"))
+
+# Sentence boundary: terminal punctuation followed by whitespace, or CJK
+# terminal punctuation which is usually not followed by a space
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+|(?<=[。！？；])")
+
 
+def split_segments(text: str):
+    """
+    Split text into lines and each line into sentences.
+    Returns (segments, layout) where layout holds, per line, the indices of
+    its segments so join_segments can restore the original line structure.
+    """
+    segments = []
+    layout = []
+    for line in text.split("\n"):
+        indices = []
+        for sentence in _SENTENCE_BOUNDARY.split(line.strip()):
+            if sentence.strip():
+                indices.append(len(segments))
+                segments.append(sentence.strip())
+        layout.append(indices)
+    return segments, layout
+
+
+def join_segments(translated, layout, sep=" "):
+    return "\n".join(sep.join(translated[i] for i in line) for line in layout)
+
+
+def _make_batches(lengths, max_batch, max_tokens):
+    """
+    Length-sorted bucketing: order segments by token length and cut batches so
+    that neither the segment count nor the padded token count is exceeded.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for i in order:
+        # Sorted ascending, so the new segment is the longest in the batch
+        if batch and (len(batch) >= max_batch or lengths[i] * (len(batch) + 1) > max_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def translate_segments(segments, tokenizer, model,
+                       max_batch=TRANSLATE_MAX_BATCH, max_tokens=TRANSLATE_MAX_BATCH_TOKENS):
+    """Translate a list of segments in padded batches; output keeps input order."""
+    if not segments:
+        return []
+    import torch
+    lengths = [len(ids) for ids in tokenizer(segments, truncation=True)["input_ids"]]
+    translated = [""] * len(segments)
+    for batch in _make_batches(lengths, max_batch, max_tokens):
+        encoded = tokenizer([segments[i] for i in batch], return_tensors="pt", padding=True, truncation=True)
+        with torch.no_grad():
+            generated = model.generate(**encoded)
+        for i, text in zip(batch, tokenizer.batch_decode(generated, skip_special_tokens=True)):
+            translated[i] = text
+    return translated
+
+
+def _translate_pair(segments, src_lang, tgt_lang):
+    """
+    Translate segments with the direct model for a pair, pooled with other
+    requests for the same pair when micro-batching is enabled. Raises
+    ModelNotFound when the pair has no model.
+    """
+    load_model(src_lang, tgt_lang)
+    return scheduler.submit(
+        ("marian", src_lang, tgt_lang),
+        lambda items: translate_segments(items, *load_model(src_lang, tgt_lang)),
+        segments,
+    )
+
+
+def _translate_all(segments, src_lang, tgt_lang):
+    """Translate segments directly, or via English when the direct model is unavailable."""
     # Case 1: direct translation
+    direct_error = None
     try:
-        tokenizer, model = load_model(src_lang, tgt_lang)
-        batch = tokenizer([text], return_tensors="pt", padding=True, truncation=True)
-        with torch.no_grad():
-            generated = model.generate(**batch)
-        translated_text = tokenizer.decode(generated[0], skip_special_tokens=True)
-        return translated_text
-    except OSError:
+        return _translate_pair(segments, src_lang, tgt_lang)
+    except ModelNotFound:
         pass
+    except OSError as e:
+        # Load failure (hub timeout, offline): not remembered, but the pivot may work
+        print(f"Direct model {src_lang}-{tgt_lang} failed to load: {e}")
+        direct_error = e
 
     # Case 2: pivot via English
     if src_lang != "en" and tgt_lang != "en":
         try:
             # src -> en
-            tokenizer1, model1 = load_model(src_lang, "en")
-            batch1 = tokenizer1([text], return_tensors="pt", padding=True, truncation=True)
-            with torch.no_grad():
-                en_ids = model1.generate(**batch1)
-            en_text = tokenizer1.decode(en_ids[0], skip_special_tokens=True)
+            en_segments = _translate_pair(segments, src_lang, "en")
 
             # en -> tgt
-            tokenizer2, model2 = load_model("en", tgt_lang)
-            batch2 = tokenizer2([en_text], return_tensors="pt", padding=True, truncation=True)
-            with torch.no_grad():
-                tgt_ids = model2.generate(**batch2)
-            return tokenizer2.decode(tgt_ids[0], skip_special_tokens=True)
+            return _translate_pair(en_segments, "en", tgt_lang)
 
-        except OSError:
+        except ModelNotFound:
+            if direct_error is not None:
+                raise direct_error
             raise TranslationNotSupported(
                 f"Translation to '{tgt_lang}' is not supported."
             )
 
+    if direct_error is not None:
+        raise direct_error
     raise TranslationNotSupported(
         f"Translation from '{src_lang}' to '{tgt_lang}' is not supported."
     )
 
 
+def _package_version(name):
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+# Identifies the models behind stored translations, like the extraction
+# cache's MODEL_VERSION; memory entries from any other version are dropped
+MT_MODEL_VERSION = os.getenv("MT_MODEL_VERSION") or "|".join([
+    "opus-mt" + ("-int8" if cpu_profile.QUANTIZE_MODELS else ""),
+    f"engine-{onnx_engine.INFERENCE_ENGINE}",
+    f"transformers-{_package_version('transformers')}",
+])
+
+translation_memory = TranslationMemory(
+    os.getenv("TRANSLATION_MEMORY_DB", "translation_memory.db"),
+    model_version=MT_MODEL_VERSION,
+    max_entries=int(os.getenv("TRANSLATION_MEMORY_SIZE", "100000")),
+)
+metrics.register_source("translation_memory", translation_memory.stats)
+
+
+@metrics.stage("translation")
+def translate_text(text: str, src_lang: str, tgt_lang: str, memory=translation_memory):
+    if not text.strip():
+        return ""
+    if src_lang == tgt_lang:
+        return text
+
+    segments, layout = split_segments(text)
+    # Chinese and Japanese do not separate sentences with spaces
+    sep = "" if tgt_lang in ("zh", "ja") else " "
+
+    if memory is None:
+        return join_segments(_translate_all(segments, src_lang, tgt_lang), layout, sep)
+
+    # Only translate segments missing from the translation memory, once each
+    translated = memory.lookup(segments, src_lang, tgt_lang)
+    pending = {}
+    for i, t in enumerate(translated):
+        if t is None:
+            pending.setdefault(normalize_segment(segments[i]), []).append(i)
+
+    if pending:
+        sources = list(pending)
+        results = _translate_all(sources, src_lang, tgt_lang)
+        memory.store(sources, results, src_lang, tgt_lang)
+        for source, result in zip(sources, results):
+            for i in pending[source]:
+                translated[i] = result
+
+    return join_segments(translated, layout, sep)
+
+
 DetectorFactory.seed = 0
 
 def detect_text_language_auto(text: str, default: str = "en") -> str:
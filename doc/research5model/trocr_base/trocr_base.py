@@ -1,5 +1,7 @@
 import os
+import time
 import random
+import argparse
 import numpy as np
 import torch
 from torch.utils.data import Dataset
@@ -7,6 +9,11 @@ from PIL import Image
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel, Seq2SeqTrainer, Seq2SeqTrainingArguments, default_data_collator, GenerationConfig
 import evaluate
 
+parser = argparse.ArgumentParser(description='Evaluate TrOCR base on the RIMES test lines')
+parser.add_argument('--quantize', action='store_true',
+                    help='Apply dynamic int8 quantization to the Linear layers (CPU) and report the CER/WER delta')
+args = parser.parse_args()
+
 # Custom dataset for RIMES
 class RimesDataset(Dataset):
     def __init__(self, img_dir, txt_dir, split_name, processor, max_target_length):
@@ -56,6 +63,10 @@ test_split  = load_split_file(os.path.join(split_dir, 'TestLines.txt'))
 # Load processor and model
 processor = TrOCRProcessor.from_pretrained('microsoft/trocr-base-handwritten', use_fast=True)
 model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-base-handwritten')
+if args.quantize:
+    # Same transformation as the backend's QUANTIZE_MODELS=1 profile
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
 
 # Initialize test dataset
 max_len = 128
@@ -99,14 +110,33 @@ model.generation_config = gen_config
 # Initialize trainer
 trainer = Seq2SeqTrainer(
     model=model,
-    args=Seq2SeqTrainingArguments(predict_with_generate=True),
+    # Quantized kernels only run on CPU
+    args=Seq2SeqTrainingArguments(predict_with_generate=True, use_cpu=args.quantize),
     tokenizer=processor.feature_extractor,
     data_collator=default_data_collator,
     compute_metrics=compute_metrics,
 )
 
 # Evaluate on test data
+start = time.time()
 test_result = trainer.evaluate(test_data, metric_key_prefix='test')
-with open('test_base.txt', 'w') as f:
-    f.write(f"CER: {test_result['test_cer']}\n")
-    f.write(f"WER: {test_result['test_wer']}\n")
\ No newline at end of file
+elapsed = time.time() - start
+if not args.quantize:
+    with open('test_base.txt', 'w') as f:
+        f.write(f"CER: {test_result['test_cer']}\n")
+        f.write(f"WER: {test_result['test_wer']}\n")
+else:
+    # Compare against the fp32 results from a previous run without --quantize
+    baseline = {}
+    if os.path.exists('test_base.txt'):
+        with open('test_base.txt') as f:
+            for line in f:
+                name, value = line.split(':')
+                baseline[name.strip()] = float(value)
+    with open('test_base_int8.txt', 'w') as f:
+        for name in ['CER', 'WER']:
+            value = test_result[f'test_{name.lower()}']
+            f.write(f'{name}: {value}\n')
+            if name in baseline:
+                f.write(f'{name} delta vs fp32: {value - baseline[name]:+.4f}\n')
+        f.write(f'Eval time (s): {elapsed:.1f}\n')
\ No newline at end of file
@@ -21,17 +21,22 @@ export default function ExtractHistory() {
 		no: 'Norwegian',
 	};
 	
+	const [nextCursor, setNextCursor] = useState(null);
+	
+	const fetchHistory = async (cursor) => {
+		const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+		const res = await fetch(`${API_BASE_URL}/api/extract_history${query}`, { credentials: 'include' });
+		if (res.ok) {
+			const data = await res.json();
+			setHistory((prev) => cursor ? [...prev, ...data.items] : data.items);
+			setNextCursor(data.next_cursor);
+		}
+		else {
+			navigate('/');
+		}
+	};
+	
 	useEffect(() => {
-		const fetchHistory = async () => {
-			const res = await fetch(`${API_BASE_URL}/api/extract_history`, { credentials: 'include' });
-			if (res.ok) {
-				const data = await res.json();
-				setHistory(data);
-			}
-			else {
-				navigate('/');
-			}
-		};
 		fetchHistory();
 	}, [navigate]);
 	
@@ -56,6 +61,11 @@ export default function ExtractHistory() {
 					</div>
 				))
 			)}
+			{nextCursor && (
+				<button onClick={() => fetchHistory(nextCursor)} className='button'>
+					Load more
+				</button>
+			)}
 		</div>
 	);
 }
\ No newline at end of file
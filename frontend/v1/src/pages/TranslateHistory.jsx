@@ -21,17 +21,22 @@ export default function TranslateHistory() {
 		no: 'Norwegian',
 	};
 	
+	const [nextCursor, setNextCursor] = useState(null);
+	
+	const fetchHistory = async (cursor) => {
+		const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+		const res = await fetch(`${API_BASE_URL}/api/translate_history${query}`, { credentials: 'include' });
+		if (res.ok) {
+			const data = await res.json();
+			setHistory((prev) => cursor ? [...prev, ...data.items] : data.items);
+			setNextCursor(data.next_cursor);
+		}
+		else {
+			navigate('/');
+		}
+	};
+	
 	useEffect(() => {
-		const fetchHistory = async () => {
-			const res = await fetch(`${API_BASE_URL}/api/translate_history`, { credentials: 'include' });
-			if (res.ok) {
-				const data = await res.json();
-				setHistory(data);
-			}
-			else {
-				navigate('/');
-			}
-		};
 		fetchHistory();
 	}, [navigate]);
 	
@@ -57,6 +62,11 @@ export default function TranslateHistory() {
 					</div>
 				))
 			)}
+			{nextCursor && (
+				<button onClick={() => fetchHistory(nextCursor)} className='button'>
+					Load more
+				</button>
+			)}
 		</div>
 	);
 }
\ No newline at end of file
@@ -95,8 +95,16 @@ export async function apiTranslate({ text, input_language, language }) {
 }
 
 // ---------- History ----------
-export async function apiExtractHistory() {
-    const res = await fetch(`${API_BASE}/api/extract_history`, {
+function historyQuery({ cursor, limit } = {}) {
+    const params = new URLSearchParams();
+    if (cursor) params.set("cursor", cursor);
+    if (limit) params.set("limit", limit);
+    const query = params.toString();
+    return query ? `?${query}` : "";
+}
+
+export async function apiExtractHistory(options) {
+    const res = await fetch(`${API_BASE}/api/extract_history${historyQuery(options)}`, {
         method: "GET",
         headers: {
             "Content-Type": "application/json",
@@ -105,11 +113,11 @@ export async function apiExtractHistory() {
     });
     const data = await res.json();
     if (!res.ok) throw new Error(data.error || "Get extract history failed");
-    return data;
+    return data; // { items, next_cursor }
 }
 
-export async function apiTranslateHistory() {
-    const res = await fetch(`${API_BASE}/api/translate_history`, {
+export async function apiTranslateHistory(options) {
+    const res = await fetch(`${API_BASE}/api/translate_history${historyQuery(options)}`, {
         method: "GET",
         headers: {
             "Content-Type": "application/json",
@@ -118,7 +126,18 @@ export async function apiTranslateHistory() {
     });
     const data = await res.json();
     if (!res.ok) throw new Error(data.error || "Get translate history failed");
-    return data;
+    return data; // { items, next_cursor }
+}
+
+export async function apiThumbnails(ids) {
+    if (!ids.length) return {};
+    const res = await fetch(`${API_BASE}/api/thumbnails?ids=${ids.join(",")}`, {
+        method: "GET",
+        headers: { ...getAuthHeader() },
+    });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error || "Get thumbnails failed");
+    return data.thumbnails; // { id: data URI }
 }
 
 export async function fetchExtractImage(timestamp) {
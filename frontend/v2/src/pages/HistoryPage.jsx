@@ -3,6 +3,7 @@ import { format } from "date-fns";
 import {
     apiExtractHistory,
     apiTranslateHistory,
+    apiThumbnails,
     fetchExtractImage,
 } from "../api";
 
@@ -12,6 +13,32 @@ export default function HistoryPage() {
     const [tab, setTab] = useState("extract");
     const [error, setError] = useState("");
     const [loading, setLoading] = useState(true);
+    const [extractCursor, setExtractCursor] = useState(null);
+    const [translateCursor, setTranslateCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    // One request fetches the thumbnails of a whole page. Older entries get
+    // their thumbnail created a few per request, so the missing ids are asked
+    // for again; entries that never get one fall back to the full image.
+    async function withImages(items) {
+        const thumbnails = {};
+        let missing = items.map((item) => item.id);
+        while (missing.length) {
+            const batch = await apiThumbnails(missing).catch(() => ({}));
+            const stillMissing = missing.filter((id) => !batch[id]);
+            if (stillMissing.length === missing.length) break;
+            Object.assign(thumbnails, batch);
+            missing = stillMissing;
+        }
+        return Promise.all(
+            items.map(async (item) => ({
+                ...item,
+                imgUrl:
+                    thumbnails[item.id] ||
+                    (await fetchExtractImage(item.timestamp)),
+            }))
+        );
+    }
 
     useEffect(() => {
         async function fetchHistory() {
@@ -23,15 +50,10 @@ export default function HistoryPage() {
                     apiTranslateHistory(),
                 ]);
 
-                const itemsWithImages = await Promise.all(
-                    ex.map(async (item) => {
-                        const imgUrl = await fetchExtractImage(item.timestamp);
-                        return { ...item, imgUrl };
-                    })
-                );
-
-                setExtractHistory(itemsWithImages);
-                setTranslateHistory(tr);
+                setExtractHistory(await withImages(ex.items));
+                setExtractCursor(ex.next_cursor);
+                setTranslateHistory(tr.items);
+                setTranslateCursor(tr.next_cursor);
             } catch (err) {
                 setError(err.message);
             } finally {
@@ -42,6 +64,29 @@ export default function HistoryPage() {
         fetchHistory();
     }, []);
 
+    async function loadMore() {
+        setError("");
+        setLoadingMore(true);
+        try {
+            if (tab === "extract") {
+                const ex = await apiExtractHistory({ cursor: extractCursor });
+                const items = await withImages(ex.items);
+                setExtractHistory((prev) => [...prev, ...items]);
+                setExtractCursor(ex.next_cursor);
+            } else {
+                const tr = await apiTranslateHistory({ cursor: translateCursor });
+                setTranslateHistory((prev) => [...prev, ...tr.items]);
+                setTranslateCursor(tr.next_cursor);
+            }
+        } catch (err) {
+            setError(err.message);
+        } finally {
+            setLoadingMore(false);
+        }
+    }
+
+    const hasMore = tab === "extract" ? !!extractCursor : !!translateCursor;
+
     return (
         <div className="min-h-screen bg-gradient-to-br from-blue-50 via-sky-50 to-blue-50 py-12 px-4">
             <div className="max-w-6xl mx-auto">
@@ -126,6 +171,18 @@ export default function HistoryPage() {
                         ) : (
                             <TranslateHistoryList items={translateHistory} />
                         )}
+
+                        {hasMore && (
+                            <div className="flex justify-center mt-8">
+                                <button
+                                    onClick={loadMore}
+                                    disabled={loadingMore}
+                                    className="px-8 py-3 rounded-2xl font-semibold bg-white/80 text-gray-700 hover:bg-white shadow-lg transition-all duration-300 disabled:opacity-50"
+                                >
+                                    {loadingMore ? "Loading..." : "Load more"}
+                                </button>
+                            </div>
+                        )}
                     </>
                 )}
             </div>
@@ -178,9 +235,9 @@ function ExtractHistoryList({ items }) {
         <div className="space-y-6">
             {items.map((item, index) => (
                 <div
-                    key={item.timestamp}
+                    key={item.id}
                     className="bg-white/80 backdrop-blur-sm rounded-3xl shadow-xl p-6 border border-sky-100 hover:shadow-2xl transition-all duration-300 animate-fade-in"
-                    style={{ animationDelay: `${index * 0.1}s` }}
+                    style={{ animationDelay: `${(index % 50) * 0.1}s` }}
                 >
                     <div className="flex flex-col lg:flex-row gap-6">
                         {/* Image Section */}
@@ -267,9 +324,9 @@ function TranslateHistoryList({ items }) {
         <div className="space-y-6">
             {items.map((item, index) => (
                 <div
-                    key={item.timestamp}
+                    key={item.id}
                     className="bg-white/80 backdrop-blur-sm rounded-3xl shadow-xl p-6 border border-green-100 hover:shadow-2xl transition-all duration-300 animate-fade-in"
-                    style={{ animationDelay: `${index * 0.1}s` }}
+                    style={{ animationDelay: `${(index % 50) * 0.1}s` }}
                 >
                     <div className="flex items-center gap-2 mb-4">
                         <span className="text-xl">🕐</span>